@@ -2,8 +2,10 @@
 from mcp.server.fastmcp import FastMCP
 
 from src.analysis.graph_cache import GraphCache
+from src.analysis.graph_sqlite_cache import GraphSqliteCache
 from src.mcp.graph_service import GraphService
 from src.mcp.tools_graph import register_graph_tools
+import os
 from pathlib import Path
 from dotenv import load_dotenv
 # load .env from project root (same folder as server.py)
@@ -12,7 +14,10 @@ load_dotenv(Path(__file__).resolve().parent / ".env")
 mcp = FastMCP("debug_graph_mcp")
 
 
-svc = GraphService(GraphCache(max_entries=8))
+# persistent graph store (shared by every server process on this machine)
+_db_path = os.getenv("GRAPH_CACHE_DB") or str(Path(__file__).resolve().parent / ".graph_cache.sqlite3")
+# None (in-memory cache only) if the DB can't be opened; the server still starts
+svc = GraphService(GraphCache(max_entries=8, store=GraphSqliteCache.open(_db_path)))
 register_graph_tools(mcp, svc)
 
 
@@ -2,11 +2,38 @@
 from __future__ import annotations
 
 import ast
+import asyncio
+import hashlib
 import json
 import os
-from typing import Any, Dict, List, Optional
+import re
+from collections import OrderedDict
+from itertools import groupby
+from typing import Any, Dict, List, Optional, Tuple
 
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from src.analysis.graph_sqlite_cache import GraphSqliteCache
+
+try:  # optional, faster JSON (C implementation)
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _json_loads(data: str | bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _json_dumps(obj: Any) -> str:
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj)
 
 
 # -------------------- tiny .env loader (no dependency) --------------------
@@ -40,93 +67,203 @@ def _read_text(path: str) -> str:
         return f.read()
 
 
-def _find_function_node(tree: ast.AST, qualname: str) -> Optional[ast.AST]:
+def _index_qualnames(tree: ast.AST) -> Dict[str, Tuple[int, int]]:
     """
+    Maps every module-level function and (nested) class method to its line span.
     qualname examples:
       - "query_graph"
       - "GraphService.query_graph"
       - "Outer.Inner.method"
     """
-    parts = qualname.split(".")
-    if len(parts) == 1:
-        fn_name = parts[0]
-        for n in tree.body:  # type: ignore[attr-defined]
-            if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef)) and n.name == fn_name:
-                return n
-        return None
-
-    # Walk classes by name
-    cls_parts, fn_name = parts[:-1], parts[-1]
-    current_body = getattr(tree, "body", [])
-    cls_node = None
-
-    for cls_name in cls_parts:
-        cls_node = None
-        for n in current_body:
-            if isinstance(n, ast.ClassDef) and n.name == cls_name:
-                cls_node = n
-                break
-        if not cls_node:
-            return None
-        current_body = cls_node.body
-
-    # Find method in that class
-    for n in current_body:
-        if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef)) and n.name == fn_name:
-            return n
-    return None
+    index: Dict[str, Tuple[int, int]] = {}
+    stack = [(getattr(tree, "body", []), "")]
+
+    while stack:
+        body, prefix = stack.pop()
+        for n in body:
+            if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                start = int(n.lineno)
+                # first definition wins, like a top-down lookup would
+                index.setdefault(prefix + n.name, (start, int(getattr(n, "end_lineno", None) or start)))
+            elif isinstance(n, ast.ClassDef):
+                stack.append((n.body, f"{prefix}{n.name}."))
+
+    return index
+
+
+# per file: src, line start offsets and (lazily) the qualname index,
+# reused while the file's mtime is unchanged
+_FILE_CACHE_MAX = 64
+_FILE_CACHE: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+
+def _load_source(file_abs: str) -> Dict[str, Any]:
+    mtime_ns = os.stat(file_abs).st_mtime_ns
+    hit = _FILE_CACHE.get(file_abs)
+    if hit and hit["mtime_ns"] == mtime_ns:
+        _FILE_CACHE.move_to_end(file_abs)
+        return hit
+
+    # text mode already normalizes \r\n / \r to \n, so "\n" offsets match ast line numbers
+    src = _read_text(file_abs)
+    line_starts = [0]
+    pos = src.find("\n")
+    while pos != -1:
+        line_starts.append(pos + 1)
+        pos = src.find("\n", pos + 1)
+
+    entry = {"mtime_ns": mtime_ns, "src": src, "line_starts": line_starts, "index": None}
+    _FILE_CACHE[file_abs] = entry
+    _FILE_CACHE.move_to_end(file_abs)
+    while len(_FILE_CACHE) > _FILE_CACHE_MAX:
+        _FILE_CACHE.popitem(last=False)
+    return entry
+
+
+def _load_source_index(file_abs: str) -> Tuple[Dict[str, Any], Dict[str, Tuple[int, int]]]:
+    entry = _load_source(file_abs)
+    if entry["index"] is None:
+        entry["index"] = _index_qualnames(ast.parse(entry["src"]))
+    return entry, entry["index"]
+
+
+def _slice_lines(entry: Dict[str, Any], start: int, end: int) -> str:
+    """
+    Lines start..end (1-based, inclusive) without the trailing newline.
+    """
+    src, line_starts = entry["src"], entry["line_starts"]
+    if start - 1 >= len(line_starts):
+        return ""
+    a = line_starts[start - 1]
+    b = line_starts[end] - 1 if end < len(line_starts) else len(src)
+    return src[a:max(a, b)]
+
+
+def _line_count(entry: Dict[str, Any]) -> int:
+    src = entry["src"]
+    n = len(entry["line_starts"])
+    return n - 1 if (not src or src.endswith("\n")) else n
+
+
+_DEF_LINE_RE = re.compile(r"\s*(?:async\s+def|def|class)\s+(\w+)")
+
+
+def _span_starts_at(entry: Dict[str, Any], start: int, name: str) -> bool:
+    """
+    True if line `start` (past any decorator lines) still defines `name`; a span from an
+    older graph can point at another function once lines above it were added/removed.
+    """
+    n_lines = _line_count(entry)
+    line = start
+    while line <= n_lines:
+        text = _slice_lines(entry, line, line)
+        if not text.lstrip().startswith("@"):
+            m = _DEF_LINE_RE.match(text)
+            return bool(m) and m.group(1) == name
+        line += 1
+    return False
 
 
 def extract_qualname_source(
     file_abs: str,
     qualname: str,
     max_lines: int = 240,
+    *,
+    ast_index: Optional[Dict[str, Tuple[int, int]]] = None,
 ) -> Dict[str, Any]:
     """
     Returns: { code, start_line, end_line, truncated }
+    ast_index: optional qualname -> (start_line, end_line) already known (e.g. from the graph);
+    when it covers qualname the file is only read, not parsed.
     """
-    src = _read_text(file_abs)
-    tree = ast.parse(src)
-
-    node = _find_function_node(tree, qualname)
-    if not node or not hasattr(node, "lineno"):
+    span = (ast_index or {}).get(qualname)
+    if span:
+        entry = _load_source(file_abs)
+        if span[1] > _line_count(entry) or not _span_starts_at(entry, span[0], qualname.rsplit(".", 1)[-1]):
+            span = None  # file changed since the index was built
+    if not span:
+        entry, index = _load_source_index(file_abs)
+        span = index.get(qualname)
+
+    n_lines = _line_count(entry)
+    if not span:
         # Fallback: return top of file (still useful)
-        lines = src.splitlines()
-        snippet = "\n".join(lines[:max_lines])
-        return {"code": snippet, "start_line": 1, "end_line": min(len(lines), max_lines), "truncated": len(lines) > max_lines}
-
-    start = int(getattr(node, "lineno", 1))
-    end = int(getattr(node, "end_lineno", start))
+        end = min(n_lines, max_lines)
+        return {"code": _slice_lines(entry, 1, end), "start_line": 1, "end_line": end, "truncated": n_lines > max_lines}
 
-    lines = src.splitlines()
-    # Python lineno is 1-based
-    block = lines[start - 1 : end]
+    start, end = span
     truncated = False
 
-    if len(block) > max_lines:
-        block = block[:max_lines]
+    if min(end, n_lines) - start + 1 > max_lines:
         truncated = True
         end = start + max_lines - 1
 
-    return {"code": "\n".join(block), "start_line": start, "end_line": end, "truncated": truncated}
+    return {"code": _slice_lines(entry, start, min(end, n_lines)), "start_line": start, "end_line": end, "truncated": truncated}
 
 
 # -------------------- Gemini call (JSON-only) --------------------
 
-def _gemini_generate_json(
+# One pooled keep-alive session: repeated calls skip the TCP + TLS handshake.
+_SESSION = requests.Session()
+_SESSION.headers.update({"Content-Type": "application/json"})
+_SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=8,
+        pool_maxsize=8,
+        max_retries=Retry(
+            total=2,
+            backoff_factor=0.3,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=frozenset({"POST"}),
+            raise_on_status=False,
+        ),
+    ),
+)
+
+_JSON_STRUCT_RE = re.compile(r'[{}"\\]')
+
+
+def _iter_json_objects(text: str):
+    """
+    Yields top-level balanced {...} spans in one left-to-right pass,
+    ignoring braces inside JSON strings (with \\ escapes).
+    """
+    depth = 0
+    start = -1
+    in_string = False
+    skip_until = -1
+
+    for m in _JSON_STRUCT_RE.finditer(text):
+        i = m.start()
+        if i < skip_until:
+            continue
+        ch = m.group()
+        if in_string:
+            if ch == "\\":
+                skip_until = i + 2  # escaped char, e.g. \" or \\
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = depth > 0
+        elif ch == "{":
+            if depth == 0:
+                start = i
+            depth += 1
+        elif ch == "}" and depth > 0:
+            depth -= 1
+            if depth == 0:
+                yield text[start : i + 1]
+
+
+def _gemini_request(
     prompt: str,
-    api_key: str,
     model: str,
     temperature: float,
     max_output_tokens: int,
-) -> Dict[str, Any]:
-    """
-    Uses Gemini generateContent with responseMimeType=application/json.
-    Returns parsed JSON dict or raises ValueError.
-    """
+) -> Tuple[str, Dict[str, Any]]:
     url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent"
-    params = {"key": api_key}
-
     payload = {
         "contents": [{"role": "user", "parts": [{"text": prompt}]}],
         "generationConfig": {
@@ -135,10 +272,64 @@ def _gemini_generate_json(
             "responseMimeType": "application/json",
         },
     }
+    return url, payload
+
+
+def _gemini_generate_json(
+    prompt: str,
+    api_key: str,
+    model: str,
+    temperature: float,
+    max_output_tokens: int,
+) -> Dict[str, Any]:
+    """
+    Uses Gemini generateContent with responseMimeType=application/json.
+    Returns parsed JSON dict or raises ValueError.
+    """
+    url, payload = _gemini_request(prompt, model, temperature, max_output_tokens)
+    r = _SESSION.post(url, params={"key": api_key}, json=payload, timeout=60)
+    r.raise_for_status()
+    return _parse_gemini_response(r.content)
+
 
-    r = requests.post(url, params=params, json=payload, timeout=60)
+# Shared async client, created on first use inside the running event loop.
+_ASYNC_CLIENT: Optional[httpx.AsyncClient] = None
+
+
+def _get_async_client() -> httpx.AsyncClient:
+    global _ASYNC_CLIENT
+    if _ASYNC_CLIENT is None or _ASYNC_CLIENT.is_closed:
+        _ASYNC_CLIENT = httpx.AsyncClient(
+            timeout=60,
+            limits=httpx.Limits(max_connections=16, max_keepalive_connections=8),
+            transport=httpx.AsyncHTTPTransport(retries=2),
+        )
+    return _ASYNC_CLIENT
+
+
+async def _gemini_generate_json_async(
+    prompt: str,
+    api_key: str,
+    model: str,
+    temperature: float,
+    max_output_tokens: int,
+) -> Dict[str, Any]:
+    """
+    Async twin of _gemini_generate_json, so several targets can be in flight at once.
+    """
+    url, payload = _gemini_request(prompt, model, temperature, max_output_tokens)
+    r = await _get_async_client().post(url, params={"key": api_key}, json=payload)
     r.raise_for_status()
-    data = r.json()
+    return _parse_gemini_response(r.content)
+
+
+# Top-level keys of the two prompted response shapes: per-target {"calls": [...]}
+# and batched {"results": [...]}.
+_RESPONSE_KEYS = ("calls", "results")
+
+
+def _parse_gemini_response(content: bytes) -> Dict[str, Any]:
+    data = _json_loads(content)
 
     # Typical shape: candidates[0].content.parts[0].text
     text = ""
@@ -146,20 +337,23 @@ def _gemini_generate_json(
         text = data["candidates"][0]["content"]["parts"][0]["text"]
     except Exception:
         # Some responses return inline JSON differently; fallback to string dump
-        text = json.dumps(data)
+        text = _json_dumps(data)
 
     text = (text or "").strip()
 
     # Strict parse first
     try:
-        return json.loads(text)
+        return _json_loads(text)
     except Exception:
-        # Best-effort extraction: first "{" ... last "}"
-        a = text.find("{")
-        b = text.rfind("}")
-        if a != -1 and b != -1 and b > a:
-            chunk = text[a : b + 1]
-            return json.loads(chunk)
+        # Best-effort extraction: first balanced {...} that parses into one of the
+        # prompted shapes; stray objects in surrounding prose (examples, echoed input) are skipped
+        for chunk in _iter_json_objects(text):
+            try:
+                obj = _json_loads(chunk)
+            except Exception:
+                continue
+            if isinstance(obj, dict) and any(k in obj for k in _RESPONSE_KEYS):
+                return obj
         raise ValueError(f"Gemini did not return valid JSON. Raw: {text[:300]}...")
 
 
@@ -213,7 +407,72 @@ FUNCTION SOURCE (may be truncated={str(truncated).lower()}):
 """.strip()
 
 
-def classify_callees_with_gemini(
+def _response_cache_key(model: str, temperature: float, prompt: str) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{model}\0{temperature!r}\0".encode("utf-8"))
+    h.update(prompt.encode("utf-8"))
+    return h.hexdigest()
+
+
+def _target_source(root_abs: str, target_node: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """
+    Returns (code_info, error). code_info carries the snippet under "code"
+    plus the file/line metadata reported back to the caller.
+    """
+    file_rel = (target_node.get("file") or "").replace("\\", "/")
+    qualname = target_node.get("qualname") or target_node.get("name") or ""
+    if not file_rel or not qualname:
+        return None, "Target node missing 'file' or 'qualname' fields"
+
+    file_abs = os.path.join(root_abs, file_rel.replace("/", os.sep))
+    if not os.path.exists(file_abs):
+        return None, f"Target file not found: {file_abs}"
+
+    ast_index = None
+    if target_node.get("lineno"):
+        ast_index = {qualname: (int(target_node["lineno"]), int(target_node.get("end_lineno") or target_node["lineno"]))}
+
+    code_meta = extract_qualname_source(file_abs=file_abs, qualname=qualname, max_lines=240, ast_index=ast_index)
+    return {
+        "file_rel": file_rel,
+        "file_abs": file_abs,
+        "qualname": qualname,
+        "start_line": code_meta["start_line"],
+        "end_line": code_meta["end_line"],
+        "truncated": code_meta["truncated"],
+        "code": code_meta["code"],
+    }, None
+
+
+def _public_code_meta(code_info: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in code_info.items() if k != "code"}
+
+
+def prepare_call_certainty_prompt(
+    *,
+    root_abs: str,
+    target_node: Dict[str, Any],
+    target_id: str,
+    callees: List[str],
+) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """
+    Source fetch + prompt assembly, independent of model/key. Returns
+    ({"prompt", "code_meta"}, error); callers may keep the result per graph/target.
+    """
+    code_info, err = _target_source(root_abs, target_node)
+    if err:
+        return None, err
+
+    prompt = build_call_certainty_prompt(
+        target_id=target_id,
+        code=code_info["code"],
+        callees=callees,
+        truncated=bool(code_info["truncated"]),
+    )
+    return {"prompt": prompt, "code_meta": _public_code_meta(code_info)}, None
+
+
+def _prepare_classification(
     *,
     root_abs: str,
     target_node: Dict[str, Any],
@@ -222,34 +481,104 @@ def classify_callees_with_gemini(
     api_key: Optional[str],
     model: str,
     temperature: float,
-    max_output_tokens: int,
-) -> Dict[str, Any]:
+    response_cache: Optional[GraphSqliteCache],
+    ttl_seconds: int,
+    ignore_cache: bool,
+    prepared: Optional[Dict[str, Any]] = None,
+) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Everything before the network call. Returns (final_result, ctx):
+    final_result is set when no request is needed (error or cache hit).
+    `prepared` is a prepare_call_certainty_prompt() result to reuse.
+    """
     _load_dotenv_if_exists(os.path.join(root_abs, ".env"))
     api_key = api_key or os.getenv("GEMINI_API_KEY")
     if not api_key:
-        return {"ok": False, "error": "Missing GEMINI_API_KEY env var or api_key param"}
+        return {"ok": False, "error": "Missing GEMINI_API_KEY env var or api_key param"}, {}
 
-    file_rel = (target_node.get("file") or "").replace("\\", "/")
-    qualname = target_node.get("qualname") or target_node.get("name") or ""
-    if not file_rel or not qualname:
-        return {"ok": False, "error": "Target node missing 'file' or 'qualname' fields"}
+    if prepared is None:
+        prepared, err = prepare_call_certainty_prompt(
+            root_abs=root_abs, target_node=target_node, target_id=target_id, callees=callees
+        )
+        if err:
+            return {"ok": False, "error": err}, {}
+
+    prompt = prepared["prompt"]
+    code_meta = prepared["code_meta"]
+
+    # Same model + prompt (same code and callees) -> reuse the stored answer
+    cache_key = _response_cache_key(model, temperature, prompt)
+    if response_cache and not ignore_cache:
+        raw = response_cache.get_response(cache_key, ttl_seconds)
+        if raw is not None:
+            return {
+                "ok": True,
+                "target_id": target_id,
+                "cached": True,
+                "code_meta": code_meta,
+                "gemini_json": _json_loads(raw),
+            }, {}
+
+    return None, {"api_key": api_key, "prompt": prompt, "cache_key": cache_key, "code_meta": code_meta}
+
+
+def _finish_classification(
+    ctx: Dict[str, Any],
+    target_id: str,
+    parsed: Any,
+    response_cache: Optional[GraphSqliteCache],
+) -> Dict[str, Any]:
+    # Minimal validation (so you don't get weird partial objects)
+    if not isinstance(parsed, dict) or "calls" not in parsed or not isinstance(parsed.get("calls"), list):
+        return {"ok": False, "error": "Gemini returned JSON but not in expected schema", "raw_json": parsed}
 
-    file_abs = os.path.join(root_abs, file_rel.replace("/", os.sep))
-    if not os.path.exists(file_abs):
-        return {"ok": False, "error": f"Target file not found: {file_abs}"}
+    if response_cache:
+        response_cache.put_response(ctx["cache_key"], _json_dumps(parsed))
 
-    code_meta = extract_qualname_source(file_abs=file_abs, qualname=qualname, max_lines=240)
-    prompt = build_call_certainty_prompt(
+    return {
+        "ok": True,
+        "target_id": target_id,
+        "cached": False,
+        "code_meta": ctx["code_meta"],
+        "gemini_json": parsed,
+    }
+
+
+def classify_callees_with_gemini(
+    *,
+    root_abs: str,
+    target_node: Dict[str, Any],
+    target_id: str,
+    callees: List[str],
+    api_key: Optional[str],
+    model: str,
+    temperature: float,
+    max_output_tokens: int,
+    response_cache: Optional[GraphSqliteCache] = None,
+    ttl_seconds: int = 7 * 86400,
+    ignore_cache: bool = False,
+    prepared: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    done, ctx = _prepare_classification(
+        root_abs=root_abs,
+        target_node=target_node,
         target_id=target_id,
-        code=code_meta["code"],
         callees=callees,
-        truncated=bool(code_meta["truncated"]),
+        api_key=api_key,
+        model=model,
+        temperature=temperature,
+        response_cache=response_cache,
+        ttl_seconds=ttl_seconds,
+        ignore_cache=ignore_cache,
+        prepared=prepared,
     )
+    if done:
+        return done
 
     try:
         parsed = _gemini_generate_json(
-            prompt=prompt,
-            api_key=api_key,
+            prompt=ctx["prompt"],
+            api_key=ctx["api_key"],
             model=model,
             temperature=temperature,
             max_output_tokens=max_output_tokens,
@@ -258,30 +587,280 @@ def classify_callees_with_gemini(
         return {
             "ok": False,
             "error": f"Gemini call/parse failed: {e}",
-            "code_meta": {
-                "file_rel": file_rel,
-                "file_abs": file_abs,
-                "qualname": qualname,
-                "start_line": code_meta["start_line"],
-                "end_line": code_meta["end_line"],
-                "truncated": code_meta["truncated"],
-            },
+            "code_meta": ctx["code_meta"],
         }
 
-    # Minimal validation (so you don't get weird partial objects)
-    if not isinstance(parsed, dict) or "calls" not in parsed or not isinstance(parsed.get("calls"), list):
-        return {"ok": False, "error": "Gemini returned JSON but not in expected schema", "raw_json": parsed}
+    return _finish_classification(ctx, target_id, parsed, response_cache)
+
+
+async def classify_callees_with_gemini_async(
+    *,
+    root_abs: str,
+    target_node: Dict[str, Any],
+    target_id: str,
+    callees: List[str],
+    api_key: Optional[str],
+    model: str,
+    temperature: float,
+    max_output_tokens: int,
+    response_cache: Optional[GraphSqliteCache] = None,
+    ttl_seconds: int = 7 * 86400,
+    ignore_cache: bool = False,
+    prepared: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    done, ctx = _prepare_classification(
+        root_abs=root_abs,
+        target_node=target_node,
+        target_id=target_id,
+        callees=callees,
+        api_key=api_key,
+        model=model,
+        temperature=temperature,
+        response_cache=response_cache,
+        ttl_seconds=ttl_seconds,
+        ignore_cache=ignore_cache,
+        prepared=prepared,
+    )
+    if done:
+        return done
+
+    try:
+        parsed = await _gemini_generate_json_async(
+            prompt=ctx["prompt"],
+            api_key=ctx["api_key"],
+            model=model,
+            temperature=temperature,
+            max_output_tokens=max_output_tokens,
+        )
+    except Exception as e:
+        return {
+            "ok": False,
+            "error": f"Gemini call/parse failed: {e}",
+            "code_meta": ctx["code_meta"],
+        }
+
+    return _finish_classification(ctx, target_id, parsed, response_cache)
+
+
+async def classify_many(targets: List[Dict[str, Any]], concurrency: int = 8) -> List[Dict[str, Any]]:
+    """
+    targets: kwargs dicts for classify_callees_with_gemini_async.
+    Runs up to `concurrency` Gemini requests at once; results keep input order.
+    """
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def _one(t: Dict[str, Any]) -> Dict[str, Any]:
+        async with sem:
+            return await classify_callees_with_gemini_async(**t)
+
+    results = await asyncio.gather(*map(_one, targets), return_exceptions=True)
+    return [
+        r if not isinstance(r, BaseException)
+        else {"ok": False, "target_id": t.get("target_id"), "error": f"Gemini call failed: {r}"}
+        for t, r in zip(targets, results)
+    ]
+
+
+# -------------------- batched classification (one request per file) --------------------
+
+# rough output budget used to size batches (tokens)
+_BATCH_TOKENS_PER_TARGET = 80
+_BATCH_TOKENS_PER_CALLEE = 40
+
+
+def build_call_certainty_batch_prompt(*, file_rel: str, entries: List[Dict[str, Any]]) -> str:
+    """
+    entries: [{target_id, code, callees, truncated}] - all functions of the same file.
+    """
+    targets_lines = []
+    sources = []
+    for e in entries:
+        callees_lines = "\n".join(f"    - {c}" for c in e["callees"]) or "    (none)"
+        targets_lines.append(f"- target_id: {e['target_id']}\n  callees:\n{callees_lines}")
+        sources.append(
+            f"### {e['target_id']} (may be truncated={str(bool(e['truncated'])).lower()})\n{e['code']}"
+        )
+
+    targets_block = "\n".join(targets_lines)
+    sources_block = "\n\n".join(sources)
+
+    return f"""
+You are analyzing several Python functions from the same file ({file_rel}).
+
+GOAL:
+For each entry in TARGETS, classify each of its callees using that target's code in FUNCTION SOURCES:
+- "always": guaranteed to execute on every normal execution of the function (no early return/raise before it).
+- "conditional": only executes on some paths (if/else, loops, try/except, short-circuit, guards, etc.).
+- "unlikely": appears in code that is effectively unreachable (after return/raise, dead branch), based on the function body.
+- "unknown": cannot decide from the function body alone.
+
+IMPORTANT:
+- Judge each target using ONLY its own function body. Do not assume runtime inputs.
+- Return ONLY valid JSON (no markdown, no backticks, no extra text).
+- Output must match this schema exactly, with one results entry per target:
+{{
+  "results": [
+    {{
+      "target_id": "string",
+      "truncated": true/false,
+      "summary": "1-2 sentences",
+      "calls": [
+        {{
+          "callee_id": "string",
+          "certainty": "always|conditional|unlikely|unknown",
+          "why": "one short sentence"
+        }}
+      ]
+    }}
+  ]
+}}
+- Double check your output for missing commas, brackets, or quotes. The output must be valid JSON and parsable by Python's json.loads().
+- If you cannot classify a callee, use "unknown" and explain why.
 
+TARGETS:
+{targets_block}
+
+FUNCTION SOURCES:
+{sources_block}
+""".strip()
+
+
+def _split_batches(entries: List[Dict[str, Any]], max_batch_size: int, max_output_tokens: int) -> List[List[Dict[str, Any]]]:
+    batches: List[List[Dict[str, Any]]] = []
+    cur: List[Dict[str, Any]] = []
+    budget = 0
+    for e in entries:
+        cost = _BATCH_TOKENS_PER_TARGET + _BATCH_TOKENS_PER_CALLEE * len(e["callees"])
+        if cur and (len(cur) >= max_batch_size or budget + cost > max_output_tokens):
+            batches.append(cur)
+            cur, budget = [], 0
+        cur.append(e)
+        budget += cost
+    if cur:
+        batches.append(cur)
+    return batches
+
+
+def classify_callees_batch_with_gemini(
+    *,
+    root_abs: str,
+    targets: List[Dict[str, Any]],
+    api_key: Optional[str],
+    model: str,
+    temperature: float,
+    max_output_tokens: int,
+    max_batch_size: int = 8,
+    response_cache: Optional[GraphSqliteCache] = None,
+    ttl_seconds: int = 7 * 86400,
+    ignore_cache: bool = False,
+) -> Dict[str, Any]:
+    """
+    targets: [{target_id, target_node, callees}]
+    Targets that live in the same file share one Gemini request (split to fit max_output_tokens).
+    Returns {ok, requests, results} with results in input order, shaped like classify_callees_with_gemini.
+    """
+    _load_dotenv_if_exists(os.path.join(root_abs, ".env"))
+    api_key = api_key or os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        return {"ok": False, "error": "Missing GEMINI_API_KEY env var or api_key param"}
+
+    # different refs can resolve to the same node: keep its first occurrence only,
+    # so a batch never asks about (and budgets for) one target twice
+    unique: Dict[str, Dict[str, Any]] = {}
+    for t in targets:
+        unique.setdefault(t["target_id"], t)
+    targets = list(unique.values())
+
+    results: Dict[str, Dict[str, Any]] = {}
+    entries: List[Dict[str, Any]] = []
+    for t in targets:
+        code_info, err = _target_source(root_abs, t["target_node"])
+        if err:
+            results[t["target_id"]] = {"ok": False, "target_id": t["target_id"], "error": err}
+            continue
+        entries.append({
+            "target_id": t["target_id"],
+            "callees": t["callees"],
+            "code": code_info["code"],
+            "truncated": code_info["truncated"],
+            "code_meta": _public_code_meta(code_info),
+        })
+
+    entries.sort(key=lambda e: e["code_meta"]["file_rel"])
+    requests_sent = 0
+
+    for file_rel, group in groupby(entries, key=lambda e: e["code_meta"]["file_rel"]):
+        for batch in _split_batches(list(group), max_batch_size, max_output_tokens):
+            prompt = build_call_certainty_batch_prompt(file_rel=file_rel, entries=batch)
+            cache_key = _response_cache_key(model, temperature, prompt)
+
+            parsed = None
+            cached = False
+            if response_cache and not ignore_cache:
+                raw = response_cache.get_response(cache_key, ttl_seconds)
+                if raw is not None:
+                    parsed, cached = _json_loads(raw), True
+
+            if parsed is None:
+                try:
+                    requests_sent += 1
+                    parsed = _gemini_generate_json(
+                        prompt=prompt,
+                        api_key=api_key,
+                        model=model,
+                        temperature=temperature,
+                        max_output_tokens=max_output_tokens,
+                    )
+                except Exception as e:
+                    for entry in batch:
+                        results[entry["target_id"]] = {
+                            "ok": False,
+                            "target_id": entry["target_id"],
+                            "error": f"Gemini call/parse failed: {e}",
+                            "code_meta": entry["code_meta"],
+                        }
+                    continue
+
+                if not isinstance(parsed, dict) or not isinstance(parsed.get("results"), list):
+                    for entry in batch:
+                        results[entry["target_id"]] = {
+                            "ok": False,
+                            "target_id": entry["target_id"],
+                            "error": "Gemini returned JSON but not in expected schema",
+                            "raw_json": parsed,
+                        }
+                    continue
+
+                if response_cache:
+                    response_cache.put_response(cache_key, _json_dumps(parsed))
+
+            # fan the batched answer back out per target
+            by_target = {
+                r.get("target_id"): r
+                for r in parsed["results"]
+                if isinstance(r, dict) and isinstance(r.get("calls"), list)
+            }
+            for entry in batch:
+                answer = by_target.get(entry["target_id"])
+                if answer is None:
+                    results[entry["target_id"]] = {
+                        "ok": False,
+                        "target_id": entry["target_id"],
+                        "error": "Gemini response has no valid entry for this target",
+                        "code_meta": entry["code_meta"],
+                    }
+                    continue
+                results[entry["target_id"]] = {
+                    "ok": True,
+                    "target_id": entry["target_id"],
+                    "cached": cached,
+                    "code_meta": entry["code_meta"],
+                    "gemini_json": answer,
+                }
+
+    ordered = [results[t["target_id"]] for t in targets if t["target_id"] in results]
     return {
-        "ok": True,
-        "target_id": target_id,
-        "code_meta": {
-            "file_rel": file_rel,
-            "file_abs": file_abs,
-            "qualname": qualname,
-            "start_line": code_meta["start_line"],
-            "end_line": code_meta["end_line"],
-            "truncated": code_meta["truncated"],
-        },
-        "gemini_json": parsed,
+        "ok": all(r.get("ok") for r in ordered),
+        "requests": requests_sent,
+        "results": ordered,
     }
@@ -0,0 +1,41 @@
+# src/analysis/file_walk.py
+from __future__ import annotations
+
+import os
+from typing import Iterator
+
+EXCLUDED_DIRS = {
+    ".venv", "venv", "env", "__pycache__", ".git", "site-packages",
+    "node_modules", "dist", "build",
+}
+
+
+def iter_py_entries(root: str) -> Iterator[os.DirEntry]:
+    """
+    Yields a DirEntry for every .py file under root, in os.walk (top-down) order.
+    Excluded and dot-dirs are pruned before descending; callers reuse entry.stat().
+    """
+    stack = [root]
+
+    while stack:
+        current = stack.pop()
+        try:
+            it = os.scandir(current)
+        except OSError:
+            continue
+
+        subdirs = []
+        with it:
+            for e in it:
+                try:
+                    is_dir = e.is_dir(follow_symlinks=False)
+                except OSError:
+                    continue
+                if is_dir:
+                    if e.name not in EXCLUDED_DIRS and not e.name.startswith("."):
+                        subdirs.append(e.path)
+                elif e.name.endswith(".py"):
+                    yield e
+
+        # reversed so the first subdirectory is walked next, like os.walk
+        stack.extend(reversed(subdirs))
@@ -1,71 +1,197 @@
 import os
 import ast
+import functools
+import logging
+import multiprocessing
+import sys
 import jedi
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from typing import Dict, List, Tuple, Set, Optional
 
-EXCLUDED_DIRS = {
-    ".venv", "venv", "env", "__pycache__", ".git", "site-packages",
-    "node_modules", "dist", "build",
-}
+from src.analysis.file_walk import iter_py_entries
+
+logger = logging.getLogger(__name__)
+
 
 # -------------------- GRAPH STRUCTURE --------------------
 
 class Graph:
+    """
+    Int-indexed storage: every id (node or edge endpoint) gets a slot in `_ids`, node
+    attributes live in parallel lists and edges are int sets per type. The legacy
+    {"id", "type", ...} / {"source", "target", "type"} records are only built by
+    `nodes` / `edges` at serialization time.
+    """
+
     def __init__(self):
-        self._nodes = {}   # id -> node dict
-        self._edges = set()  # (src, dst, type)
+        self._index: Dict[str, int] = {}   # id -> slot
+        self._ids: List[str] = []
+        self._types: List[Optional[str]] = []  # None: id only seen as an edge endpoint
+        self._attrs: List[Optional[dict]] = []
+        self._adj: Dict[str, Dict[int, Set[int]]] = {}  # edge type -> src slot -> {dst slot}
+
+    def _slot(self, id: str) -> int:
+        i = self._index.get(id)
+        if i is None:
+            # interned once here; every output record then shares the same string object
+            id = sys.intern(id)
+            i = self._index[id] = len(self._ids)
+            self._ids.append(id)
+            self._types.append(None)
+            self._attrs.append(None)
+        return i
 
     def add_node(self, id, type, **kw):
-        if id not in self._nodes:
-            self._nodes[id] = {"id": id, "type": type, **kw}
+        i = self._slot(id)
+        if self._types[i] is None:
+            self._types[i] = type
+            self._attrs[i] = kw
 
     def add_edge(self, src, dst, type):
-        self._edges.add((src, dst, type))
+        by_src = self._adj.get(type)
+        if by_src is None:
+            by_src = self._adj[type] = {}
+        s = self._slot(src)
+        dsts = by_src.get(s)
+        if dsts is None:
+            dsts = by_src[s] = set()
+        dsts.add(self._slot(dst))
 
     def has_node(self, id: str) -> bool:
-        return id in self._nodes
+        i = self._index.get(id)
+        return i is not None and self._types[i] is not None
+
+    def iter_nodes(self):
+        """
+        Yields (id, type, attrs) without building node records; attrs is the live kw dict.
+        """
+        for id, type, attrs in zip(self._ids, self._types, self._attrs):
+            if type is not None:
+                yield id, type, attrs
 
     @property
     def nodes(self):
-        return list(self._nodes.values())
+        return [{"id": id, "type": type, **attrs} for id, type, attrs in self.iter_nodes()]
 
     @property
     def edges(self):
-        return [{"source": s, "target": t, "type": typ} for (s, t, typ) in self._edges]
+        # legacy edge-record list, only materialized for serialization
+        ids = self._ids
+        return [
+            {"source": ids[s], "target": ids[t], "type": typ}
+            for typ, by_src in self._adj.items()
+            for s, dsts in by_src.items()
+            for t in dsts
+        ]
 
 
 # -------------------- FILE DISCOVERY --------------------
 
 def find_files(root: str) -> List[str]:
-    root = os.path.abspath(root)
-    py_files = []
+    return [e.path for e in iter_py_entries(os.path.abspath(root))]
+
+
+# abspath -> (mtime_ns, size, src, tree, cost). Rebuilds only re-parse files whose stat changed.
+# Trees are shared between builds, so the graph passes must treat them as read-only.
+# Bounded by estimated retained bytes: a parsed tree plus its source holds ~30x the
+# source size (measured on asyncio), so the count of files alone says little.
+_AST_CACHE_MAX_BYTES = 256 * 1024 * 1024
+_AST_BYTES_PER_SRC_BYTE = 32
+_AST_CACHE: "OrderedDict[str, Tuple[int, int, str, ast.AST, int]]" = OrderedDict()
+_ast_cache_bytes = 0
+
+
+def clear_ast_cache(root: Optional[str] = None) -> int:
+    """
+    Drops cached trees (all of them, or only files under root) and the matching jedi
+    Projects. Returns how many trees were dropped.
+    """
+    global _ast_cache_bytes
+    if root is None:
+        n = len(_AST_CACHE)
+        _AST_CACHE.clear()
+        _WORKER_PROJECTS.clear()
+        _ast_cache_bytes = 0
+        return n
+
+    _WORKER_PROJECTS.pop(os.path.abspath(root), None)
+    prefix = os.path.join(os.path.abspath(root), "")
+    drop = [path for path in _AST_CACHE if path.startswith(prefix)]
+    for path in drop:
+        _ast_cache_bytes -= _AST_CACHE.pop(path)[4]
+    return len(drop)
+
+
+# Below this many cache misses the files are read serially; thread start-up isn't worth it.
+_PARALLEL_READ_MIN = 64
+
+
+def _read_source(path: str) -> Optional[str]:
+    try:
+        with open(path, encoding="utf8") as fh:
+            return fh.read()
+    except Exception:
+        return None
 
-    for dirpath, dirnames, filenames in os.walk(root):
-        dirnames[:] = [
-            d for d in dirnames
-            if d not in EXCLUDED_DIRS and not d.startswith(".")
-        ]
-        for f in filenames:
-            if f.endswith(".py"):
-                py_files.append(os.path.join(dirpath, f))
 
-    return py_files
+def _read_sources(paths: List[str]) -> List[Optional[str]]:
+    """
+    File reads release the GIL, so threads overlap the I/O (cold page cache, network drives).
+    Parsing stays in this thread: shipping ASTs back from worker processes costs more
+    to unpickle than ast.parse costs to begin with.
+    """
+    if len(paths) < _PARALLEL_READ_MIN:
+        return [_read_source(p) for p in paths]
+    with ThreadPoolExecutor(max_workers=min(8, (os.cpu_count() or 1) + 4)) as ex:
+        return list(ex.map(_read_source, paths))
 
 
 def parse_files(root: str) -> dict:
+    global _ast_cache_bytes
     root = os.path.abspath(root)
     files = find_files(root)
-    data = {}
+    parsed: Dict[str, Tuple[str, ast.AST]] = {}
+    misses = []
 
     for path in files:
         try:
-            with open(path, encoding="utf8") as fh:
-                src = fh.read()
+            st = os.stat(path)
+        except OSError:
+            continue
+        hit = _AST_CACHE.get(path)
+        if hit and hit[0] == st.st_mtime_ns and hit[1] == st.st_size:
+            _AST_CACHE.move_to_end(path)
+            parsed[path] = (hit[2], hit[3])
+        else:
+            misses.append((path, st))
+
+    for (path, st), src in zip(misses, _read_sources([m[0] for m in misses])):
+        if src is None:
+            continue
+        try:
             tree = ast.parse(src)
         except Exception:
             continue
-
-        rel = os.path.relpath(path, root).replace("\\", "/")
+        parsed[path] = (src, tree)
+        cost = len(src) * _AST_BYTES_PER_SRC_BYTE
+        old = _AST_CACHE.pop(path, None)
+        if old:
+            _ast_cache_bytes -= old[4]
+        _AST_CACHE[path] = (st.st_mtime_ns, st.st_size, src, tree, cost)
+        _ast_cache_bytes += cost
+
+    while _ast_cache_bytes > _AST_CACHE_MAX_BYTES and _AST_CACHE:
+        _ast_cache_bytes -= _AST_CACHE.popitem(last=False)[1][4]
+
+    # keep discovery order: it decides node/edge insertion order downstream
+    data = {}
+    for path in files:
+        if path not in parsed:
+            continue
+        src, tree = parsed[path]
+        rel = sys.intern(os.path.relpath(path, root).replace("\\", "/"))
         data[path] = {"rel": rel, "src": src, "tree": tree}
 
     return data
@@ -73,15 +199,44 @@ def parse_files(root: str) -> dict:
 
 # -------------------- IMPORT ALIASES --------------------
 
+# Statements (imports, class/def) only ever sit in statement lists, never inside expressions.
+_STMT_CONTAINERS = (ast.stmt, ast.excepthandler, ast.match_case)
+_IMPORT_NODES = (ast.Import, ast.ImportFrom)
+
+
+def iter_imports(tree):
+    """
+    Import/ImportFrom nodes at any depth (function-level imports included), in ast.walk
+    order, but only descending through statements: expression subtrees are never visited.
+    """
+    todo = deque([tree])
+    while todo:
+        node = todo.popleft()
+        if isinstance(node, _IMPORT_NODES):
+            yield node
+            continue
+        todo.extend(c for c in ast.iter_child_nodes(node) if isinstance(c, _STMT_CONTAINERS))
+
+
+def _module_rel(module: str) -> str:
+    return module.replace(".", "/") + ".py"
+
+
 def extract_aliases(tree) -> Tuple[dict, dict]:
+    """
+    Import aliases with their target files already resolved:
+      mod_alias:  alias -> rel path               (import utils.c as c)
+      func_alias: alias -> (rel path, real name)  (from utils.c import add as plus)
+    """
     mod_alias, func_alias = {}, {}
-    for n in ast.walk(tree):
+    for n in iter_imports(tree):
         if isinstance(n, ast.Import):
             for a in n.names:
-                mod_alias[a.asname or a.name] = a.name
+                mod_alias[a.asname or a.name] = _module_rel(a.name)
         elif isinstance(n, ast.ImportFrom) and n.module:
+            rel_path = _module_rel(n.module)
             for a in n.names:
-                func_alias[a.asname or a.name] = f"{n.module}.{a.name}"
+                func_alias[a.asname or a.name] = (rel_path, a.name)
     return mod_alias, func_alias
 
 
@@ -90,58 +245,43 @@ def extract_aliases(tree) -> Tuple[dict, dict]:
 def resolve_fallback(func_node, mod_alias, func_alias) -> List[Tuple[str, str]]:
     # case: imported function/class called directly: name(...)
     if isinstance(func_node, ast.Name):
-        name = func_node.id
-        if name in func_alias:
-            full = func_alias[name]  # e.g. utils.c.add
-            module, real_name = full.rsplit(".", 1)
-            rel_path = module.replace(".", "/") + ".py"
-            return [(rel_path, real_name)]
-        return []
+        target = func_alias.get(func_node.id)  # e.g. ("utils/c.py", "add")
+        return [target] if target else []
 
     # case: module alias call: mod.func(...)
     if isinstance(func_node, ast.Attribute) and isinstance(func_node.value, ast.Name):
         alias = func_node.value.id
-        name = func_node.attr
 
-        if alias in mod_alias:
-            module = mod_alias[alias]
-            rel_path = module.replace(".", "/") + ".py"
-            return [(rel_path, name)]
+        rel_path = mod_alias.get(alias)
+        if rel_path:
+            return [(rel_path, func_node.attr)]
 
-        if alias in func_alias:
-            full = func_alias[alias]
-            module, real_name = full.rsplit(".", 1)
-            rel_path = module.replace(".", "/") + ".py"
-            return [(rel_path, real_name)]
+        target = func_alias.get(alias)
+        if target:
+            return [target]
 
     return []
 
 
 # -------------------- JEDI RESOLUTION (FIXED FOR METHODS) --------------------
 
-def resolve_with_jedi(
-    project,
-    file_path: str,
-    src: str,
-    func_node,
-    root: str,
-    include_external: bool,
-) -> List[Tuple[str, str]]:
+def _jedi_position(func_node) -> Tuple[int, int]:
+    line = func_node.lineno
+    col = func_node.col_offset
+
+    # IMPORTANT: for Attribute like `admin.audit`, infer at the "audit" token, not at "admin"
+    if isinstance(func_node, ast.Attribute) and getattr(func_node, "end_col_offset", None) is not None:
+        col = max(func_node.col_offset, func_node.end_col_offset - len(func_node.attr))
+    return line, col
+
+
+def _infer_at(script, line: int, col: int, root: str, include_external: bool) -> List[Tuple[str, str]]:
     """
     Returns list of (target_rel, target_name), where target_name matches our graph node naming:
       - function: "log"
       - method:   "Admin.audit"
     """
     try:
-        script = jedi.Script(code=src, path=file_path, project=project)
-
-        line = func_node.lineno
-        col = func_node.col_offset
-
-        # IMPORTANT: for Attribute like `admin.audit`, infer at the "audit" token, not at "admin"
-        if isinstance(func_node, ast.Attribute) and getattr(func_node, "end_col_offset", None) is not None:
-            col = max(func_node.col_offset, func_node.end_col_offset - len(func_node.attr))
-
         defs = script.infer(line, col)
     except Exception:
         return []
@@ -173,8 +313,70 @@ def resolve_with_jedi(
     return results
 
 
+# -------------------- BATCHED JEDI (optionally in worker processes) --------------------
+
+# Worker processes only pay off for larger projects: each one imports jedi and
+# warms its own inference caches.
+_JEDI_POOL_MIN_SITES = 400
+
+# root -> jedi.Project, per process (pool workers, or this process when resolving
+# in-process); dropped by clear_ast_cache together with the parsed trees.
+_WORKER_PROJECTS: Dict[str, "jedi.Project"] = {}
+
+
+def _jedi_resolve_file(job) -> List[List[Tuple[str, str]]]:
+    """
+    job = (root, include_external, path, src, [(line, col), ...]).
+    Returns the targets for each site, in order.
+    """
+    root, include_external, path, src, sites = job
+    project = _WORKER_PROJECTS.get(root)
+    if project is None:
+        project = _WORKER_PROJECTS[root] = jedi.Project(root)
+
+    results = []
+    for line, col in sites:
+        # A fresh Script per site: one shared Script accumulates inference state and
+        # starts returning nothing for later sites in large modules. parso's cache
+        # keeps the re-parse cheap; the Project (and its caches) is still shared.
+        try:
+            script = jedi.Script(code=src, path=path, project=project)
+        except Exception:
+            results.append([])
+            continue
+        results.append(_infer_at(script, line, col, root, include_external))
+    return results
+
+
+def _use_jedi_pool(n_sites: int) -> bool:
+    return os.name != "nt" and (os.cpu_count() or 1) > 1 and n_sites >= _JEDI_POOL_MIN_SITES
+
+
+def _jedi_resolve_all(jobs: list) -> List[List[List[Tuple[str, str]]]]:
+    if _use_jedi_pool(sum(len(j[4]) for j in jobs)):
+        try:
+            # spawn, not fork: the server process runs threads (reader pool, HTTP clients,
+            # SQLite lock) and owns the stdio JSON-RPC stream; a forked child could inherit
+            # a held lock or a half-written stdout buffer.
+            with ProcessPoolExecutor(
+                max_workers=min(os.cpu_count() or 1, len(jobs)),
+                mp_context=multiprocessing.get_context("spawn"),
+            ) as ex:
+                return list(ex.map(_jedi_resolve_file, jobs))
+        except (OSError, NotImplementedError, BrokenProcessPool) as e:
+            # no usable pool here (sandbox, killed worker...): resolve in-process
+            logger.warning("jedi process pool unavailable (%r); resolving in-process", e)
+    return [_jedi_resolve_file(job) for job in jobs]
+
+
 # -------------------- FUNCTION GRAPH --------------------
 
+# Pass 2 subtrees that can never contain a Call/Assign/def; not worth dispatching into.
+_CALL_FREE_NODES = (
+    ast.Name, ast.Constant, ast.expr_context, ast.operator, ast.boolop, ast.cmpop, ast.unaryop,
+    ast.alias, ast.Import, ast.ImportFrom, ast.Pass, ast.Break, ast.Continue, ast.Global, ast.Nonlocal,
+)
+
 def build_function_graph(
     root: str,
     include_external: bool = False,
@@ -183,7 +385,6 @@ def build_function_graph(
     root = os.path.abspath(root)
     files_data = parse_files(root)
     g = Graph()
-    project = jedi.Project(root)
 
     use_jedi = (resolve_calls == "jedi")
 
@@ -197,6 +398,11 @@ def build_function_graph(
             self.rel = rel
             self.class_stack: List[str] = []
 
+        def generic_visit(self, node):
+            for child in ast.iter_child_nodes(node):
+                if isinstance(child, _STMT_CONTAINERS):
+                    self.visit(child)
+
         def visit_ClassDef(self, node: ast.ClassDef):
             class_name = node.name
             class_defs.setdefault(class_name, set()).add(self.rel)
@@ -215,12 +421,14 @@ def build_function_graph(
         def visit_FunctionDef(self, node: ast.FunctionDef):
             file_id = f"file:{self.rel}"
             g.add_node(file_id, "file", path=self.rel)
+            # line span lets source extraction slice the file without re-parsing it
+            span = {"lineno": node.lineno, "end_lineno": getattr(node, "end_lineno", None) or node.lineno}
 
             if self.class_stack:
                 cls = self.class_stack[-1]
                 qual = f"{cls}.{node.name}"
                 func_id = f"func:{self.rel}:{qual}"
-                g.add_node(func_id, "method", file=self.rel, name=node.name, qualname=qual, class_name=cls)
+                g.add_node(func_id, "method", file=self.rel, name=node.name, qualname=qual, class_name=cls, **span)
 
                 class_id = f"class:{self.rel}:{cls}"
                 g.add_node(class_id, "class", file=self.rel, name=cls)
@@ -228,7 +436,7 @@ def build_function_graph(
                 g.add_edge(file_id, func_id, "contains")
             else:
                 func_id = f"func:{self.rel}:{node.name}"
-                g.add_node(func_id, "function", file=self.rel, name=node.name, qualname=node.name)
+                g.add_node(func_id, "function", file=self.rel, name=node.name, qualname=node.name, **span)
                 g.add_edge(file_id, func_id, "contains")
 
             self.generic_visit(node)
@@ -237,12 +445,16 @@ def build_function_graph(
         rel = info["rel"]
         NodeCollector(rel).visit(info["tree"])
 
+    # pass 2 adds no nodes, so this index stays exact for the "unique method" fallback
+    methods_by_name: Dict[str, List[dict]] = {}
+    for _, node_type, attrs in g.iter_nodes():
+        if node_type == "method":
+            methods_by_name.setdefault(attrs["name"], []).append(attrs)
+
     def resolve_class_to_rel(class_name: str, current_rel: str, func_alias: dict) -> Optional[Tuple[str, str]]:
-        # imported class (from x import Admin)
+        # imported class (from x import Admin) -> ("x.py", "Admin")
         if class_name in func_alias:
-            full = func_alias[class_name]           # e.g. utils.models.Admin
-            module, real_cls = full.rsplit(".", 1)  # utils.models , Admin
-            return (module.replace(".", "/") + ".py", real_cls)
+            return func_alias[class_name]
 
         hits = class_defs.get(class_name, set())
         if len(hits) == 1:
@@ -252,6 +464,17 @@ def build_function_graph(
         return None
 
     # ---- PASS 2: detect call edges ----
+    # Calls that need jedi are collected first (with the targets to use if jedi finds nothing)
+    # and resolved together per file afterwards.
+
+    jedi_jobs = []     # (root, include_external, path, src, [(line, col), ...])
+    jedi_pending = []  # per job: [(caller_id, fallback_targets), ...]
+
+    def add_call_edges(caller_id: str, targets) -> None:
+        for target_rel, target_name in targets:
+            callee_id = f"func:{target_rel}:{target_name}"
+            if g.has_node(callee_id):
+                g.add_edge(caller_id, callee_id, "call")
 
     for path, info in files_data.items():
         rel = info["rel"]
@@ -259,12 +482,24 @@ def build_function_graph(
         tree = info["tree"]
         mod_alias, func_alias = extract_aliases(tree)
 
+        # rel and func_alias are fixed for the whole file, so only the class name varies
+        @functools.lru_cache(maxsize=None)
+        def resolve_class(class_name: str) -> Optional[Tuple[str, str]]:
+            return resolve_class_to_rel(class_name, rel, func_alias)
+
         class Current(ast.NodeVisitor):
             def __init__(self):
+                self.jedi_sites: List[Tuple[int, int]] = []
+                self.jedi_pending: List[Tuple[str, list]] = []
                 self.current_class: Optional[str] = None
                 self.current_func: Optional[str] = None
                 self.local_types: Dict[str, Tuple[str, str]] = {}  # var -> (class_rel, class_name)
 
+            def generic_visit(self, node):
+                for child in ast.iter_child_nodes(node):
+                    if not isinstance(child, _CALL_FREE_NODES):
+                        self.visit(child)
+
             def visit_ClassDef(self, node):
                 prev = self.current_class
                 self.current_class = node.name
@@ -299,7 +534,7 @@ def build_function_graph(
                 if not cls_name:
                     return
 
-                resolved = resolve_class_to_rel(cls_name, rel, func_alias)
+                resolved = resolve_class(cls_name)
                 if not resolved:
                     return
 
@@ -322,11 +557,22 @@ def build_function_graph(
                 caller_id = f"func:{rel}:{self.current_func}"
                 targets = resolve_fallback(node.func, mod_alias, func_alias)
 
-                if not targets and use_jedi:
-                    targets = resolve_with_jedi(project, path, src, node.func, root, include_external)
+                if not targets:
+                    targets = self._fallback_targets(node)
+                    if use_jedi:
+                        # jedi wins when it resolves anything; the fallback is kept for when it doesn't
+                        self.jedi_sites.append(_jedi_position(node.func))
+                        self.jedi_pending.append((caller_id, targets))
+                        targets = ()
+
+                add_call_edges(caller_id, targets)
+                self.generic_visit(node)
+
+            def _fallback_targets(self, node) -> list:
+                targets = []
 
                 # smart fallback for obj.method()
-                if not targets and isinstance(node.func, ast.Attribute):
+                if isinstance(node.func, ast.Attribute):
                     method_name = node.func.attr
                     recv = node.func.value
 
@@ -345,7 +591,7 @@ def build_function_graph(
                             cls_name = ctor.attr
 
                         if cls_name:
-                            resolved = resolve_class_to_rel(cls_name, rel, func_alias)
+                            resolved = resolve_class(cls_name)
                             if resolved:
                                 class_rel, cls = resolved
                                 targets = [(class_rel, f"{cls}.{method_name}")]
@@ -353,22 +599,22 @@ def build_function_graph(
                 # last resort (ONLY if unique) to avoid false positives like 6 instead of 5
                 if not targets and isinstance(node.func, ast.Attribute):
                     method_name = node.func.attr
-                    cands = [
-                        n for n in g.nodes
-                        if n.get("type") == "method" and n.get("name") == method_name
-                    ]
+                    cands = methods_by_name.get(method_name, ())
                     if len(cands) == 1:
                         n = cands[0]
                         targets = [(n["file"], n["qualname"])]
 
-                for target_rel, target_name in targets:
-                    callee_id = f"func:{target_rel}:{target_name}"
-                    if g.has_node(callee_id):
-                        g.add_edge(caller_id, callee_id, "call")
+                return targets
 
-                self.generic_visit(node)
+        cur = Current()
+        cur.visit(tree)
+        if cur.jedi_sites:
+            jedi_jobs.append((root, include_external, path, src, cur.jedi_sites))
+            jedi_pending.append(cur.jedi_pending)
 
-        Current().visit(tree)
+    for pending, resolved in zip(jedi_pending, _jedi_resolve_all(jedi_jobs)):
+        for (caller_id, fallback), targets in zip(pending, resolved):
+            add_call_edges(caller_id, targets or fallback)
 
     return g
 
@@ -395,7 +641,7 @@ def build_file_graph(root: str, include_external: bool = False) -> Graph:
         tree = info["tree"]
         file_id = f"file:{rel}"
 
-        for n in ast.walk(tree):
+        for n in iter_imports(tree):
             if isinstance(n, ast.Import):
                 for a in n.names:
                     mod = a.name
@@ -1,13 +1,36 @@
 # src/analysis/graph_cache.py
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Any, Callable, Dict, Optional, Tuple, List
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple, List
+import hashlib
 import os
+import pickle
+import struct
+import sys
 import uuid
 
+from src.analysis.file_walk import iter_py_entries
+from src.analysis.graph_sqlite_cache import GraphSqliteCache
 
-_EXCLUDE_DIRS = {".git", "__pycache__", ".venv", "venv", "env", "node_modules", "dist", "build"}
+try:  # optional, faster non-cryptographic hash for fingerprints
+    import xxhash
+except ImportError:
+    xxhash = None
+
+
+def _new_fingerprint_hasher():
+    if xxhash is not None:
+        return xxhash.xxh3_128()
+    return hashlib.blake2b(digest_size=16)
+
+
+# Part of every persisted key: bump whenever the builder's output changes shape
+# (e.g. new node fields), so graphs pickled by older code are never loaded.
+GRAPH_FORMAT_VERSION = 2
+
+_MISSING = object()  # memo sentinel: a derived value may legitimately be None
 
 
 @dataclass
@@ -17,62 +40,142 @@ class GraphEntry:
     granularity: str
     include_external: bool
     resolve_calls: str
-    signature: Tuple[Tuple[str, int, int], ...]  # (relpath, mtime, size)
+    fingerprint: str  # project_fingerprint() at build time
     graph: Dict[str, Any]
+    size_bytes: int = 0  # serialized size, used for the byte cap
+    # Indices derived from `graph` (adjacency etc.); dropped whenever the graph is rebuilt.
+    derived: Dict[Hashable, Any] = field(default_factory=dict)
+
+    def memo(self, name: Hashable, factory: Callable[[], Any]) -> Any:
+        value = self.derived.get(name, _MISSING)
+        if value is _MISSING:
+            value = self.derived[name] = factory()
+        return value
+
+
+def project_fingerprint(root_path: str) -> str:
+    """
+    Stat-only digest of every .py file under root (relpath, mtime_ns, size).
+    No file contents are read.
+    """
+    root = os.path.abspath(root_path)
+    items: List[Tuple[str, int, int]] = []
+
+    # same file set as the builder parses, so unrelated trees (site-packages...) don't count
+    for e in iter_py_entries(root):
+        try:
+            st = e.stat()
+        except OSError:
+            continue
+        rel = os.path.relpath(e.path, root).replace("\\", "/")
+        items.append((rel, st.st_mtime_ns, st.st_size))
+
+    items.sort()
+    h = _new_fingerprint_hasher()
+    pack = struct.Struct("<qQ").pack
+    for rel, mtime_ns, size in items:
+        h.update(rel.encode("utf-8", "surrogateescape"))
+        h.update(b"\0")
+        h.update(pack(mtime_ns, size))
+    return h.hexdigest()
 
 
 class GraphCache:
-    def __init__(self, max_entries: int = 8):
+    def __init__(
+        self,
+        max_entries: int = 8,
+        max_bytes: int = 512 * 1024 * 1024,
+        store: Optional[GraphSqliteCache] = None,
+    ):
         self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.store = store  # optional persistent layer shared across processes
         self._by_id: Dict[str, GraphEntry] = {}
         self._by_key: Dict[Tuple[str, str, bool, str], str] = {}  # (root, granularity, include_external, resolve_calls) -> graph_id
-        self._lru: List[str] = []
+        self._lru: "OrderedDict[str, None]" = OrderedDict()  # oldest first, most recent last
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
 
-    def _compute_signature(self, root_path: str) -> Tuple[Tuple[str, int, int], ...]:
-        root = os.path.abspath(root_path)
-        items: List[Tuple[str, int, int]] = []
-
-        for dirpath, dirnames, filenames in os.walk(root):
-            dirnames[:] = [d for d in dirnames if not d.startswith(".") and d not in _EXCLUDE_DIRS]
-            for f in filenames:
-                if not f.endswith(".py"):
-                    continue
-                full = os.path.join(dirpath, f)
-                try:
-                    st = os.stat(full)
-                except OSError:
-                    continue
-                rel = os.path.relpath(full, root).replace("\\", "/")
-                items.append((rel, int(st.st_mtime), int(st.st_size)))
-
-        items.sort()
-        return tuple(items)
+    @staticmethod
+    def _store_key(key: Tuple[str, str, bool, str]) -> str:
+        root, granularity, include_external, resolve_calls = key
+        return f"v{GRAPH_FORMAT_VERSION}|{root}|{granularity}|{int(include_external)}|{resolve_calls}"
+
+    @staticmethod
+    def _serialize(graph: Dict[str, Any]) -> Optional[bytes]:
+        try:
+            return pickle.dumps(graph, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return None
+
+    def _load_persisted(self, key: Tuple[str, str, bool, str], fingerprint: str) -> Tuple[Optional[Dict[str, Any]], int]:
+        if not self.store:
+            return None, 0
+        row = self.store.get(self._store_key(key))
+        if not row or row[0] != fingerprint:
+            return None, 0
+        try:
+            return pickle.loads(row[1]), len(row[1])
+        except Exception:
+            return None, 0
+
+    def _store_graph(self, key: Tuple[str, str, bool, str], graph: Dict[str, Any], fingerprint: str) -> int:
+        """
+        Serializes once: persists the blob (if a store is configured) and returns its size.
+        """
+        blob = self._serialize(graph)
+        if blob is None:
+            return sys.getsizeof(graph)
+        if self.store:
+            self.store.put(self._store_key(key), fingerprint, blob)
+        return len(blob)
 
     def _touch_lru(self, graph_id: str) -> None:
-        if graph_id in self._lru:
-            self._lru.remove(graph_id)
-        self._lru.insert(0, graph_id)
+        self._lru[graph_id] = None
+        self._lru.move_to_end(graph_id)
 
-        while len(self._lru) > self.max_entries:
-            evict = self._lru.pop()
+        # keep at least the entry just touched, even if it alone exceeds max_bytes
+        while len(self._lru) > self.max_entries or (self._bytes > self.max_bytes and len(self._lru) > 1):
+            evict, _ = self._lru.popitem(last=False)
             self._evict(evict)
 
     def _evict(self, graph_id: str) -> None:
         entry = self._by_id.pop(graph_id, None)
         if not entry:
             return
+        self._bytes -= entry.size_bytes
         key = (entry.root, entry.granularity, entry.include_external, entry.resolve_calls)
         self._by_key.pop(key, None)
 
+    def peek(self, graph_id: str) -> Optional[GraphEntry]:
+        """Like get(), without touching LRU order or hit/miss stats."""
+        return self._by_id.get(graph_id)
+
     def get(self, graph_id: str) -> Optional[GraphEntry]:
         entry = self._by_id.get(graph_id)
         if entry:
+            self._hits += 1
             self._touch_lru(graph_id)
+        else:
+            self._misses += 1
         return entry
 
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._hits + self._misses
+        return {
+            "entries": len(self._by_id),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": round(self._hits / lookups, 3) if lookups else None,
+        }
+
     def list(self) -> List[Dict[str, Any]]:
         out = []
-        for gid in self._lru:
+        for gid in reversed(self._lru):
             e = self._by_id.get(gid)
             if not e:
                 continue
@@ -85,25 +188,43 @@ class GraphCache:
                     "resolve_calls": e.resolve_calls,
                     "nodes": len(e.graph.get("nodes", [])),
                     "edges": len(e.graph.get("edges", [])),
+                    "bytes": e.size_bytes,
                 }
             )
         return out
 
+    @staticmethod
+    def _clear_parse_cache(root: Optional[str] = None) -> None:
+        # graph_builder (and its parsed-tree cache) only exists once something was built
+        builder = sys.modules.get("src.analysis.graph_builder")
+        if builder is not None:
+            builder.clear_ast_cache(root)
+
     def clear(self, which: str = "all") -> Dict[str, Any]:
         if which == "all":
             n = len(self._by_id)
+            if self.store:
+                # only rows for graphs held here: the store is shared with other server processes
+                for key in self._by_key:
+                    self.store.delete(self._store_key(key))
             self._by_id.clear()
             self._by_key.clear()
             self._lru.clear()
+            self._bytes = 0
+            self._clear_parse_cache()
             return {"cleared": "all", "count": n}
 
         entry = self._by_id.get(which)
         if not entry:
             return {"cleared": which, "count": 0}
 
+        self._clear_parse_cache(entry.root)
+        if self.store:
+            self.store.delete(self._store_key(
+                (entry.root, entry.granularity, entry.include_external, entry.resolve_calls)
+            ))
         self._evict(which)
-        if which in self._lru:
-            self._lru.remove(which)
+        self._lru.pop(which, None)
         return {"cleared": which, "count": 1}
 
  
@@ -120,15 +241,26 @@ class GraphCache:
         resolve_calls = (resolve_calls or "jedi").strip().lower()
         key = (root, granularity, include_external, resolve_calls)
 
-        if not force_rebuild and key in self._by_key:
-            gid = self._by_key[key]
+        gid = None if force_rebuild else self._by_key.get(key)
+        if gid is not None:
             entry = self._by_id.get(gid)
             if entry:
+                self._hits += 1
                 self._touch_lru(gid)
                 return entry, True
 
-        signature = self._compute_signature(root)
-        graph = builder(root, granularity, include_external, resolve_calls)
+        self._misses += 1
+        # Taken before building, so edits made during the build show up as stale later.
+        fingerprint = project_fingerprint(root)
+
+        # Warm start from the persistent store when the project is unchanged on disk.
+        graph, size_bytes = (None, 0)
+        if self.store and not force_rebuild:
+            graph, size_bytes = self._load_persisted(key, fingerprint)
+        cached = graph is not None
+        if graph is None:
+            graph = builder(root, granularity, include_external, resolve_calls)
+            size_bytes = self._store_graph(key, graph, fingerprint)
 
         gid = str(uuid.uuid4())
         entry = GraphEntry(
@@ -137,14 +269,16 @@ class GraphCache:
             granularity=granularity,
             include_external=include_external,
             resolve_calls=resolve_calls,
-            signature=signature,
+            fingerprint=fingerprint,
             graph=graph,
+            size_bytes=size_bytes,
         )
 
         self._by_id[gid] = entry
+        self._bytes += size_bytes
         self._by_key[key] = gid
         self._touch_lru(gid)
-        return entry, False
+        return entry, cached
 
 
     def refresh_if_stale(
@@ -156,13 +290,19 @@ class GraphCache:
         if not entry:
             return None, False
 
-        new_sig = self._compute_signature(entry.root)
-        if new_sig == entry.signature:
+        # stat-only check; nothing is parsed unless the fingerprint moved
+        fingerprint = project_fingerprint(entry.root)
+        if fingerprint == entry.fingerprint:
             self._touch_lru(graph_id)
             return entry, False
 
         graph = builder(entry.root, entry.granularity, entry.include_external, entry.resolve_calls)
-        entry.signature = new_sig
+        key = (entry.root, entry.granularity, entry.include_external, entry.resolve_calls)
+        size_bytes = self._store_graph(key, graph, fingerprint)
+        entry.fingerprint = fingerprint
         entry.graph = graph
+        entry.derived.clear()
+        self._bytes += size_bytes - entry.size_bytes
+        entry.size_bytes = size_bytes
         self._touch_lru(graph_id)
         return entry, True
@@ -1,28 +1,206 @@
 # src/analysis/graph_queries.py
 
+from array import array
 from collections import deque
-from typing import List, Dict
+from typing import Any, List, Dict, Tuple
 
 
 def _build_adjacency(graph_data: dict, edge_types: set[str] | None = None) -> dict:
     adj: Dict[str, List[str]] = {}
+    get = adj.get
     for edge in graph_data.get("edges", []):
         if edge_types and edge.get("type") not in edge_types:
             continue
-        adj.setdefault(edge["source"], []).append(edge["target"])
+        s = edge["source"]
+        lst = get(s)
+        if lst is None:
+            adj[s] = [edge["target"]]
+        else:
+            lst.append(edge["target"])
     return adj
 
 def _build_reverse_adjacency(graph_data: dict, edge_types: set[str] | None = None) -> dict:
     rev: Dict[str, List[str]] = {}
+    get = rev.get
     for edge in graph_data.get("edges", []):
         if edge_types and edge.get("type") not in edge_types:
             continue
-        rev.setdefault(edge["target"], []).append(edge["source"])
+        t = edge["target"]
+        lst = get(t)
+        if lst is None:
+            rev[t] = [edge["source"]]
+        else:
+            lst.append(edge["source"])
     return rev
 
 
 
-def find_callers(graph, target_id):
+def _csr(n: int, heads: array, tails: array) -> Tuple[array, array]:
+    """
+    Counting sort of (head, tail) pairs into CSR: neighbors of u are
+    indices[indptr[u]:indptr[u + 1]], in original edge order.
+    """
+    indptr = array("l", [0]) * (n + 1)
+    for h in heads:
+        indptr[h + 1] += 1
+    for i in range(n):
+        indptr[i + 1] += indptr[i]
+    cursor = indptr[:-1]
+    indices = array("l", [0]) * len(heads)
+    for h, t in zip(heads, tails):
+        indices[cursor[h]] = t
+        cursor[h] += 1
+    return indptr, indices
+
+
+def build_edge_index(graph_data: dict) -> Dict[str, Any]:
+    """
+    One pass over the edges; meant to be built once per graph and reused by every query.
+      out/in: {edge_type: {node: [neighbors]}}
+      csr:    int-indexed forward/reverse adjacency over all edge types, for traversals
+    """
+    out_by_type: Dict[str, Dict[str, List[str]]] = {}
+    in_by_type: Dict[str, Dict[str, List[str]]] = {}
+    pos: Dict[str, int] = {}
+    ids: List[str] = []
+    heads = array("l")
+    tails = array("l")
+    # edges arrive grouped by type, so the per-type buckets only change on a type switch
+    cur_et = object()
+    out_t: Dict[str, List[str]] = {}
+    in_t: Dict[str, List[str]] = {}
+    for edge in graph_data.get("edges", []):
+        s, t, et = edge["source"], edge["target"], edge.get("type")
+        if et != cur_et:
+            cur_et = et
+            out_t = out_by_type.get(et)
+            if out_t is None:
+                out_t = out_by_type[et] = {}
+                in_t = in_by_type[et] = {}
+            else:
+                in_t = in_by_type[et]
+        lst = out_t.get(s)
+        if lst is None:
+            out_t[s] = [t]
+        else:
+            lst.append(t)
+        lst = in_t.get(t)
+        if lst is None:
+            in_t[t] = [s]
+        else:
+            lst.append(s)
+
+        si = pos.get(s)
+        if si is None:
+            si = pos[s] = len(ids)
+            ids.append(s)
+        ti = pos.get(t)
+        if ti is None:
+            ti = pos[t] = len(ids)
+            ids.append(t)
+        heads.append(si)
+        tails.append(ti)
+
+    n = len(ids)
+    csr = {"ids": ids, "pos": pos, "out": _csr(n, heads, tails), "in": _csr(n, tails, heads)}
+    return {"out": out_by_type, "in": in_by_type, "csr": csr}
+
+
+def _reachable(csr: Dict[str, Any], direction: str, node_id: str) -> List[str]:
+    start = csr["pos"].get(node_id)
+    if start is None:
+        return []
+    indptr, indices = csr[direction]
+    ids = csr["ids"]
+
+    # BFS where the output list is the queue: `for` keeps reading items appended behind it,
+    # so there is no pop/popleft per node and ids are translated once at the end
+    seen = bytearray(len(ids))
+    seen[start] = 1
+    order = [start]
+    for u in order:
+        for v in indices[indptr[u]:indptr[u + 1]]:
+            if not seen[v]:
+                seen[v] = 1
+                order.append(v)
+    return [ids[v] for v in order[1:]]
+
+
+def _expand_level(
+    frontier: List[int], indptr: array, indices: array, parent: array, dist: array, other_dist: array
+) -> Tuple[List[int], int]:
+    """
+    Expands one whole BFS level. Returns the next frontier and the discovered node that
+    is closest to the other side's root (-1 if the searches haven't met yet).
+    """
+    nxt = []
+    meet, meet_d = -1, -1
+    for u in frontier:
+        du = dist[u] + 1
+        for v in indices[indptr[u]:indptr[u + 1]]:
+            if parent[v] < 0:
+                parent[v] = u
+                dist[v] = du
+                nxt.append(v)
+                dv = other_dist[v]
+                if dv >= 0 and (meet < 0 or dv < meet_d):
+                    meet, meet_d = v, dv
+    return nxt, meet
+
+
+def _bfs_path(csr: Dict[str, Any], source_id: str, target_id: str) -> List[str]:
+    """
+    Bidirectional BFS: grows whichever frontier is smaller, a full level at a time,
+    so the first meeting point found gives a shortest path.
+    """
+    if source_id == target_id:
+        return [source_id]
+    pos = csr["pos"]
+    s, t = pos.get(source_id), pos.get(target_id)
+    if s is None or t is None:
+        return []
+    out_ptr, out_idx = csr["out"]
+    in_ptr, in_idx = csr["in"]
+    ids = csr["ids"]
+    n = len(ids)
+
+    par_f = array("l", [-1]) * n
+    par_b = array("l", [-1]) * n
+    dist_f = array("l", [-1]) * n
+    dist_b = array("l", [-1]) * n
+    par_f[s], dist_f[s] = s, 0
+    par_b[t], dist_b[t] = t, 0
+    front_f, front_b = [s], [t]
+
+    meet = -1
+    while front_f and front_b and meet < 0:
+        if len(front_f) <= len(front_b):
+            front_f, meet = _expand_level(front_f, out_ptr, out_idx, par_f, dist_f, dist_b)
+        else:
+            front_b, meet = _expand_level(front_b, in_ptr, in_idx, par_b, dist_b, dist_f)
+
+    if meet < 0:
+        return []
+
+    path = []
+    cur = meet
+    while cur != s:
+        path.append(ids[cur])
+        cur = par_f[cur]
+    path.append(source_id)
+    path.reverse()
+
+    cur = meet
+    while cur != t:
+        cur = par_b[cur]
+        path.append(ids[cur])
+    return path
+
+
+def find_callers(graph, target_id, index=None):
+    if index is not None:
+        return sorted(set(index["in"].get("call", {}).get(target_id, ())))
+
     callers = set()
     for e in graph.get("edges", []):
         if e.get("type") != "call":
@@ -32,7 +210,10 @@ def find_callers(graph, target_id):
     return sorted(callers)
 
 
-def find_callees(graph, source_id):
+def find_callees(graph, source_id, index=None):
+    if index is not None:
+        return sorted(set(index["out"].get("call", {}).get(source_id, ())))
+
     callees = set()
     for e in graph.get("edges", []):
         if e.get("type") != "call":
@@ -42,10 +223,13 @@ def find_callees(graph, source_id):
     return sorted(callees)
 
 
-def find_dependencies(graph_data: dict, node_id: str) -> List[str]:
+def find_dependencies(graph_data: dict, node_id: str, index=None) -> List[str]:
     """
     כל מה שנגיש מ-node_id דרך קשתות קדימה (graph traversal פשוט).
     """
+    if index is not None:
+        return _reachable(index["csr"], "out", node_id)
+
     adj = _build_adjacency(graph_data)
     visited = set()
     stack = [node_id]
@@ -63,10 +247,13 @@ def find_dependencies(graph_data: dict, node_id: str) -> List[str]:
     return list(visited)
 
 
-def find_reverse_dependencies(graph_data: dict, node_id: str) -> List[str]:
+def find_reverse_dependencies(graph_data: dict, node_id: str, index=None) -> List[str]:
     """
     כל מי שיכול להגיע ל-node_id דרך קשתות (תלויות הפוכות).
     """
+    if index is not None:
+        return _reachable(index["csr"], "in", node_id)
+
     rev_adj = _build_reverse_adjacency(graph_data)
     visited = set()
     stack = [node_id]
@@ -84,10 +271,13 @@ def find_reverse_dependencies(graph_data: dict, node_id: str) -> List[str]:
     return list(visited)
 
 
-def find_path(graph_data: dict, source_id: str, target_id: str) -> List[str]:
+def find_path(graph_data: dict, source_id: str, target_id: str, index=None) -> List[str]:
     """
     מסלול כלשהו בין source ל-target (אם קיים), באמצעות BFS.
     """
+    if index is not None:
+        return _bfs_path(index["csr"], source_id, target_id)
+
     adj = _build_adjacency(graph_data)
 
     queue = deque([source_id])
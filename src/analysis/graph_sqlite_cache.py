@@ -0,0 +1,107 @@
+# src/analysis/graph_sqlite_cache.py
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional, Tuple
+
+
+class GraphSqliteCache:
+    """
+    Persistent graph store shared across MCP server processes.
+    Rows: key -> (fingerprint, serialized graph blob). Callers decide what a
+    fingerprint mismatch means (usually: rebuild and put again).
+    The same DB also keeps AI responses (JSON text keyed by a prompt hash).
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = os.path.abspath(db_path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        try:
+            with self._lock:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS graphs ("
+                    "key TEXT PRIMARY KEY, fingerprint TEXT, data BLOB, created REAL)"
+                )
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    "key TEXT PRIMARY KEY, data TEXT, created REAL)"
+                )
+                self._conn.commit()
+        except sqlite3.Error:
+            self._conn.close()
+            raise
+
+    @classmethod
+    def open(cls, db_path: str) -> Optional["GraphSqliteCache"]:
+        """
+        Like the constructor, but returns None when the DB can't be opened or set up
+        (unwritable directory, bad path, corrupt file...), so callers run without persistence.
+        """
+        try:
+            return cls(db_path)
+        except (sqlite3.Error, OSError):
+            return None
+
+    def get(self, key: str) -> Optional[Tuple[str, bytes]]:
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT fingerprint, data FROM graphs WHERE key = ?", (key,)
+                ).fetchone()
+        except sqlite3.Error:
+            return None
+        if not row:
+            return None
+        return row[0], bytes(row[1])
+
+    def put(self, key: str, fingerprint: str, blob: bytes) -> None:
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO graphs (key, fingerprint, data, created) VALUES (?, ?, ?, ?)",
+                    (key, fingerprint, sqlite3.Binary(blob), time.time()),
+                )
+                self._conn.commit()
+        except sqlite3.Error:
+            # Persistence is best-effort: the in-memory cache still works.
+            return
+
+    def delete(self, key: Optional[str] = None) -> int:
+        try:
+            with self._lock:
+                if key is None:
+                    cur = self._conn.execute("DELETE FROM graphs")
+                else:
+                    cur = self._conn.execute("DELETE FROM graphs WHERE key = ?", (key,))
+                self._conn.commit()
+                return cur.rowcount
+        except sqlite3.Error:
+            return 0
+
+    def get_response(self, key: str, ttl_seconds: float) -> Optional[str]:
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT data, created FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+        except sqlite3.Error:
+            return None
+        if not row or time.time() - row[1] > ttl_seconds:
+            return None
+        return row[0]
+
+    def put_response(self, key: str, data: str) -> None:
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, data, created) VALUES (?, ?, ?)",
+                    (key, data, time.time()),
+                )
+                self._conn.commit()
+        except sqlite3.Error:
+            return
@@ -1,20 +1,46 @@
 # src/analysis/graph_stats.py
 from __future__ import annotations
 
-from typing import Any, Dict
+import heapq
+from typing import Any, Dict, Optional
 from collections import defaultdict
 
 
-def graph_overview(graph: Dict[str, Any], edge_type: str = "call", top_n: int = 10) -> Dict[str, Any]:
+_PER_FILE_KEYS = {"function": "functions", "method": "methods", "class": "classes"}
+
+
+def overview_index(graph: Dict[str, Any], edge_type: str = "call") -> Dict[str, Any]:
+    """
+    Everything graph_overview derives from a full pass over nodes and edges.
+    Depends only on (graph, edge_type), so callers with a cached graph can keep it.
+    """
     nodes = graph.get("nodes", [])
-    edges = [e for e in graph.get("edges", []) if e.get("type") == edge_type]
 
-    nodes_by_id = {n.get("id"): n for n in nodes if n.get("id")}
+    # one pass over nodes: id lookup for labels + per-file counts
+    nodes_by_id: Dict[str, Dict[str, Any]] = {}
+    per_file: Dict[str, Dict[str, int]] = {}
+    for n in nodes:
+        nid = n.get("id")
+        if nid:
+            nodes_by_id[nid] = n
+        key = _PER_FILE_KEYS.get(n.get("type"))
+        f = n.get("file")
+        if not key or not f:
+            continue
+        counts = per_file.get(f)
+        if counts is None:
+            counts = per_file[f] = {"functions": 0, "methods": 0, "classes": 0}
+        counts[key] += 1
 
     indeg = defaultdict(int)
     outdeg = defaultdict(int)
 
-    for e in edges:
+    # single pass: filter by type and count degrees without materializing the edge list
+    edges_of_type = 0
+    for e in graph.get("edges", []):
+        if e.get("type") != edge_type:
+            continue
+        edges_of_type += 1
         s, t = e.get("source"), e.get("target")
         if s and t:
             outdeg[s] += 1
@@ -22,48 +48,67 @@ def graph_overview(graph: Dict[str, Any], edge_type: str = "call", top_n: int =
 
     involved = set(indeg.keys()) | set(outdeg.keys())
 
-    def label(nid: str) -> str:
-        n = nodes_by_id.get(nid, {})
-        if n.get("type") == "file":
-            return n.get("path", nid)
-        qn = n.get("qualname") or n.get("name") or nid
-        file = n.get("file")
-        return f"{file}:{qn}" if file else qn
-
-    entrypoints = sorted([nid for nid in involved if indeg.get(nid, 0) == 0 and outdeg.get(nid, 0) > 0])
-    leaves = sorted([nid for nid in involved if outdeg.get(nid, 0) == 0 and indeg.get(nid, 0) > 0])
-
-    top_hotspots = sorted(involved, key=lambda nid: indeg.get(nid, 0), reverse=True)[:top_n]
-    top_hubs = sorted(involved, key=lambda nid: outdeg.get(nid, 0), reverse=True)[:top_n]
-
-    per_file = defaultdict(lambda: {"functions": 0, "methods": 0, "classes": 0})
-    for n in nodes:
-        f = n.get("file") or (n.get("path") if n.get("type") == "file" else None)
-        if not f:
-            continue
-        t = n.get("type")
-        if t == "function":
-            per_file[f]["functions"] += 1
-        elif t == "method":
-            per_file[f]["methods"] += 1
-        elif t == "class":
-            per_file[f]["classes"] += 1
-
     per_file_list = [{"file": k, **v} for k, v in per_file.items()]
     per_file_list.sort(key=lambda x: (x["functions"] + x["methods"] + x["classes"]), reverse=True)
 
     return {
-        "edge_type": edge_type,
+        "nodes_by_id": nodes_by_id,
+        "indeg": indeg,
+        "outdeg": outdeg,
+        "involved": involved,
+        "entrypoints": sorted([nid for nid in involved if indeg.get(nid, 0) == 0 and outdeg.get(nid, 0) > 0]),
+        "leaves": sorted([nid for nid in involved if outdeg.get(nid, 0) == 0 and indeg.get(nid, 0) > 0]),
+        "per_file": per_file_list,
+        "labels": {},  # filled lazily by graph_overview
         "counts": {
             "nodes_total": len(nodes),
             "edges_total": len(graph.get("edges", [])),
-            "edges_of_type": len(edges),
+            "edges_of_type": edges_of_type,
             "nodes_involved_in_edges": len(involved),
         },
-        "entrypoints": [label(n) for n in entrypoints[:top_n]],
-        "leaves": [label(n) for n in leaves[:top_n]],
+    }
+
+
+def graph_overview(
+    graph: Dict[str, Any],
+    edge_type: str = "call",
+    top_n: int = 10,
+    index: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    `index` is a cached overview_index(graph, edge_type); without it one is built for this call.
+    """
+    if index is None:
+        index = overview_index(graph, edge_type)
+
+    nodes_by_id = index["nodes_by_id"]
+    indeg, outdeg, involved = index["indeg"], index["outdeg"], index["involved"]
+    labels = index["labels"]
+
+    def label(nid: str) -> str:
+        cached = labels.get(nid)
+        if cached is not None:
+            return cached
+        n = nodes_by_id.get(nid, {})
+        if n.get("type") == "file":
+            text = n.get("path", nid)
+        else:
+            qn = n.get("qualname") or n.get("name") or nid
+            file = n.get("file")
+            text = f"{file}:{qn}" if file else qn
+        labels[nid] = text
+        return text
+
+    top_hotspots = heapq.nlargest(top_n, involved, key=lambda nid: indeg.get(nid, 0))
+    top_hubs = heapq.nlargest(top_n, involved, key=lambda nid: outdeg.get(nid, 0))
+
+    return {
+        "edge_type": edge_type,
+        "counts": dict(index["counts"]),
+        "entrypoints": [label(n) for n in index["entrypoints"][:top_n]],
+        "leaves": [label(n) for n in index["leaves"][:top_n]],
         "top_hotspots_by_fanin": [{"node": label(n), "fanin": indeg.get(n, 0)} for n in top_hotspots],
         "top_hubs_by_fanout": [{"node": label(n), "fanout": outdeg.get(n, 0)} for n in top_hubs],
-        "per_file": per_file_list[:top_n],
+        "per_file": index["per_file"][:top_n],
         "note": "Entrypoints/leaves relevant mainly for -call graph.",
     }
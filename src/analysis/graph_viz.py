@@ -1,22 +1,61 @@
 # src/analysis/graph_viz.py
 from __future__ import annotations
 
+import io
 from collections import deque
+from functools import lru_cache
 from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
 
 
 DEFAULT_EDGE_TYPES: Set[str] = {"call"}
 
 
+_PREFIXES = ("func:", "class:", "file:")
+
+
+@lru_cache(maxsize=4096)
 def _label_from_id(node_id: str) -> str:
-    if ":" in node_id:
-        prefix, rest = node_id.split(":", 1)
-        if prefix in {"func", "class", "file"}:
-            return rest
+    if node_id.startswith(_PREFIXES):
+        return node_id.split(":", 1)[1]
     return node_id
 
 
-def _iter_edges(graph: Dict[str, Any], edge_types: Set[str]) -> Iterable[Tuple[str, str]]:
+@lru_cache(maxsize=32)
+def _sorted_edge_types(edge_types: frozenset) -> Tuple[str, ...]:
+    return tuple(sorted(edge_types))
+
+
+def _dot_label(node_id: str) -> str:
+    return _label_from_id(node_id).replace('"', '\\"')
+
+
+def build_edges_by_type(graph: Dict[str, Any]) -> Dict[str, List[Tuple[str, str]]]:
+    """
+    Validated (source, target) pairs bucketed by edge type, in edge order.
+    The graph is static per cache entry, so this runs once and replaces the
+    per-edge isinstance checks of every later export.
+    """
+    by_type: Dict[str, List[Tuple[str, str]]] = {}
+    for e in graph.get("edges", []):
+        if not isinstance(e, dict):
+            continue
+        s = e.get("source")
+        t = e.get("target")
+        if isinstance(s, str) and isinstance(t, str):
+            by_type.setdefault(e.get("type"), []).append((s, t))
+    return by_type
+
+
+def _iter_edges(
+    graph: Dict[str, Any],
+    edge_types: Set[str],
+    edges_by_type: Optional[Dict[str, List[Tuple[str, str]]]] = None,
+) -> Iterable[Tuple[str, str]]:
+    if edges_by_type is not None:
+        for et in (sorted(edge_types) if edge_types else list(edges_by_type)):
+            yield from edges_by_type.get(et, ())
+        return
+
     for e in graph.get("edges", []):
         if not isinstance(e, dict):
             continue
@@ -28,18 +67,52 @@ def _iter_edges(graph: Dict[str, Any], edge_types: Set[str]) -> Iterable[Tuple[s
             yield s, t
 
 
-def _build_adj(graph: Dict[str, Any], edge_types: Set[str]) -> Dict[str, List[str]]:
-    adj: Dict[str, List[str]] = {}
-    for s, t in _iter_edges(graph, edge_types):
-        adj.setdefault(s, []).append(t)
-    return adj
-
-
-def _build_rev(graph: Dict[str, Any], edge_types: Set[str]) -> Dict[str, List[str]]:
-    rev: Dict[str, List[str]] = {}
-    for s, t in _iter_edges(graph, edge_types):
-        rev.setdefault(t, []).append(s)
-    return rev
+def _build_adj_rev(
+    graph: Dict[str, Any],
+    edge_types: Set[str],
+    edges_by_type: Optional[Dict[str, List[Tuple[str, str]]]] = None,
+) -> Dict[str, Any]:
+    """
+    Int-slot forward/reverse adjacency in one edge pass:
+      ids: slot -> node id, pos: node id -> slot
+      out/in: per-slot neighbour slots
+      pairs: (src, tgt) slots in edge order
+    """
+    ids: List[str] = []
+    pos: Dict[str, int] = {}
+    adj: List[List[int]] = []
+    rev: List[List[int]] = []
+    pairs: List[Tuple[int, int]] = []
+    for s, t in _iter_edges(graph, edge_types, edges_by_type):
+        si = pos.get(s)
+        if si is None:
+            si = pos[s] = len(ids)
+            ids.append(s)
+            adj.append([])
+            rev.append([])
+        ti = pos.get(t)
+        if ti is None:
+            ti = pos[t] = len(ids)
+            ids.append(t)
+            adj.append([])
+            rev.append([])
+        adj[si].append(ti)
+        rev[ti].append(si)
+        pairs.append((si, ti))
+    return {"ids": ids, "pos": pos, "out": adj, "in": rev, "pairs": pairs}
+
+
+def build_viz_adjacency(
+    graph: Dict[str, Any],
+    edge_types: Optional[Set[str]] = None,
+    edges_by_type: Optional[Dict[str, List[Tuple[str, str]]]] = None,
+) -> Dict[str, Any]:
+    """
+    Adjacency for the exports. Build once per graph/edge_types and pass it
+    back as `adjacency=` to skip the edge scan on every export.
+    """
+    edge_types = set(edge_types or DEFAULT_EDGE_TYPES)
+    return _build_adj_rev(graph, edge_types, edges_by_type)
 
 
 def _collect_subgraph(
@@ -49,11 +122,15 @@ def _collect_subgraph(
     depth: int,
     edge_types: Set[str],
     max_nodes: int,
+    adjacency: Optional[Dict[str, Any]] = None,
+    sort: bool = False,
+    edges_by_type: Optional[Dict[str, List[Tuple[str, str]]]] = None,
 ) -> Tuple[List[str], List[Tuple[str, str]], bool]:
     """
     Returns (nodes, edges, truncated)
-    nodes: list of node_ids
-    edges: list of (src, tgt)
+    nodes: list of node_ids (BFS order from focus, or sorted when sort=True)
+    edges: list of (src, tgt) (discovery order, or sorted when sort=True);
+           both endpoints are always in nodes
     """
     # No focus: render whole (bounded)
     if not focus:
@@ -67,46 +144,86 @@ def _collect_subgraph(
         node_set = set(nodes)
 
         edges: List[Tuple[str, str]] = []
-        for s, t in _iter_edges(graph, edge_types):
-            if s in node_set and t in node_set:
-                edges.append((s, t))
+        if adjacency is not None:
+            # slot bitmap: membership is one byte read instead of two string hashes
+            ids = adjacency["ids"]
+            pos = adjacency["pos"]
+            mask = bytearray(len(ids))
+            for nid in node_set:
+                i = pos.get(nid)
+                if i is not None:
+                    mask[i] = 1
+            edges = [(ids[s], ids[t]) for s, t in adjacency["pairs"] if mask[s] and mask[t]]
+        else:
+            for s, t in _iter_edges(graph, edge_types, edges_by_type):
+                if s in node_set and t in node_set:
+                    edges.append((s, t))
         return sorted(node_set), edges, truncated
 
-    adj = _build_adj(graph, edge_types)
-    rev = _build_rev(graph, edge_types)
+    if adjacency is None:
+        adjacency = build_viz_adjacency(graph, edge_types, edges_by_type)
+    ids = adjacency["ids"]
+
+    start = adjacency["pos"].get(focus)
+    if start is None:
+        # focus has no edges of these types
+        return ([focus], [], False) if max_nodes > 0 else ([], [], True)
+
+    out_adj = adjacency["out"] if direction in ("out", "both") else None
+    in_adj = adjacency["in"] if direction in ("in", "both") else None
 
-    q = deque([(focus, 0)])
-    seen: Set[str] = set()
-    edges_set: Set[Tuple[str, str]] = set()
+    # BFS over int slots; string ids are only decoded at the end
+    q = deque([(start, 0)])
+    seen = bytearray(len(ids))
+    order: List[int] = []
+    # (src << 32) | tgt -> None, an ordered set of edges in discovery order
+    edges_seen: Dict[int, None] = {}
     truncated = False
 
     while q:
         cur, d = q.popleft()
-        if cur in seen:
+        if seen[cur]:
             continue
 
-        seen.add(cur)
-        if len(seen) > max_nodes:
+        if len(order) >= max_nodes:
             truncated = True
             break
+        seen[cur] = 1
+        order.append(cur)
 
         if d >= depth:
             continue
 
-        if direction in ("out", "both"):
-            for nb in adj.get(cur, []):
-                edges_set.add((cur, nb))
-                if nb not in seen:
+        # neighbours that can no longer fit are neither queued nor given edges
+        if out_adj is not None:
+            for nb in out_adj[cur]:
+                if seen[nb]:
+                    edges_seen[cur << 32 | nb] = None
+                elif len(order) < max_nodes:
+                    edges_seen[cur << 32 | nb] = None
                     q.append((nb, d + 1))
-
-        if direction in ("in", "both"):
-            for nb in rev.get(cur, []):
-                edges_set.add((nb, cur))
-                if nb not in seen:
+                else:
+                    truncated = True
+
+        if in_adj is not None:
+            for nb in in_adj[cur]:
+                if seen[nb]:
+                    edges_seen[nb << 32 | cur] = None
+                elif len(order) < max_nodes:
+                    edges_seen[nb << 32 | cur] = None
                     q.append((nb, d + 1))
-
-    nodes = sorted(seen)
-    edges = sorted(edges_set)
+                else:
+                    truncated = True
+
+    pairs = [(k >> 32, k & 0xFFFFFFFF) for k in edges_seen]
+    if truncated:
+        # neighbours queued before the cap was hit may never have been visited
+        pairs = [(s, t) for s, t in pairs if seen[s] and seen[t]]
+
+    nodes = [ids[i] for i in order]
+    edges = [(ids[s], ids[t]) for s, t in pairs]
+    if sort:
+        return sorted(nodes), sorted(edges), truncated
     return nodes, edges, truncated
 
 
@@ -117,6 +234,9 @@ def export_mermaid(
     depth: int = 1,
     edge_types: Optional[Set[str]] = None,
     max_nodes: int = 200,
+    adjacency: Optional[Dict[str, Any]] = None,
+    sort: bool = False,
+    edges_by_type: Optional[Dict[str, List[Tuple[str, str]]]] = None,
 ) -> Tuple[str, Dict[str, Any]]:
     edge_types = set(edge_types or DEFAULT_EDGE_TYPES)
 
@@ -127,30 +247,32 @@ def export_mermaid(
         depth=depth,
         edge_types=edge_types,
         max_nodes=max_nodes,
+        adjacency=adjacency,
+        sort=sort,
+        edges_by_type=edges_by_type,
     )
 
     idx = {nid: i for i, nid in enumerate(nodes)}
-    lines = ["graph TD"]
+    buf = io.StringIO()
+    write = buf.write
+    write("graph TD")
+    for i, nid in enumerate(nodes):
+        write(f'\n  n{i}["{_label_from_id(nid)}"]')
 
-    for nid in nodes:
-        lines.append(f'  n{idx[nid]}["{_label_from_id(nid)}"]')
-
-    edges_rendered = 0
     for s, t in edges:
-        if s in idx and t in idx:
-            lines.append(f"  n{idx[s]} --> n{idx[t]}")
-            edges_rendered += 1
+        write(f"\n  n{idx[s]} --> n{idx[t]}")
+    edges_rendered = len(edges)
 
     meta = {
         "focus": focus,
-        "edge_types": sorted(edge_types),
+        "edge_types": list(_sorted_edge_types(frozenset(edge_types))),
         "direction": direction,
         "depth": depth,
         "nodes_rendered": len(nodes),
         "edges_rendered": edges_rendered,
         "truncated": truncated,
     }
-    return "\n".join(lines), meta
+    return buf.getvalue(), meta
 
 
 def export_dot(
@@ -160,6 +282,9 @@ def export_dot(
     depth: int = 1,
     edge_types: Optional[Set[str]] = None,
     max_nodes: int = 200,
+    adjacency: Optional[Dict[str, Any]] = None,
+    sort: bool = False,
+    edges_by_type: Optional[Dict[str, List[Tuple[str, str]]]] = None,
 ) -> Tuple[str, Dict[str, Any]]:
     edge_types = set(edge_types or DEFAULT_EDGE_TYPES)
 
@@ -170,30 +295,31 @@ def export_dot(
         depth=depth,
         edge_types=edge_types,
         max_nodes=max_nodes,
+        adjacency=adjacency,
+        sort=sort,
+        edges_by_type=edges_by_type,
     )
 
     idx = {nid: i for i, nid in enumerate(nodes)}
-    lines = ["digraph G {"]
-
-    for nid in nodes:
-        label = _label_from_id(nid).replace('"', '\\"')
-        lines.append(f'  n{idx[nid]} [label="{label}"];')
+    buf = io.StringIO()
+    write = buf.write
+    write("digraph G {")
+    for i, nid in enumerate(nodes):
+        write(f'\n  n{i} [label="{_dot_label(nid)}"];')
 
-    edges_rendered = 0
     for s, t in edges:
-        if s in idx and t in idx:
-            lines.append(f"  n{idx[s]} -> n{idx[t]};")
-            edges_rendered += 1
+        write(f"\n  n{idx[s]} -> n{idx[t]};")
+    edges_rendered = len(edges)
 
-    lines.append("}")
+    write("\n}")
 
     meta = {
         "focus": focus,
-        "edge_types": sorted(edge_types),
+        "edge_types": list(_sorted_edge_types(frozenset(edge_types))),
         "direction": direction,
         "depth": depth,
         "nodes_rendered": len(nodes),
         "edges_rendered": edges_rendered,
         "truncated": truncated,
     }
-    return "\n".join(lines), meta
+    return buf.getvalue(), meta
@@ -1,17 +1,33 @@
 # src/analysis/node_resolver.py
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Set
+
+from src.mcp.query_types import QUERY_ALIASES
 
-_QUERY_SYNONYMS = {
-    "outgoing": "callees",
-    "incoming": "callers",
-    "deps": "dependencies",
-    "rev_deps": "reverse_dependencies",
-}
 
 def coerce_query_type(qt: str) -> str:
-    return _QUERY_SYNONYMS.get(qt, qt)
+    return QUERY_ALIASES.get(qt, qt)
 
-def resolve_node_id(graph: Dict[str, Any], ref: Optional[str]) -> Optional[str]:
+def build_resolver_index(graph: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Built once per graph:
+      ids:     set of node ids
+      id_list: node ids in node order
+      suffix:  last ":"-segment -> node ids ending with it, in node order
+    """
+    ids = set()
+    id_list: List[str] = []
+    suffix: Dict[str, List[str]] = {}
+    for n in graph.get("nodes", []):
+        if not isinstance(n, dict) or not n.get("id"):
+            continue
+        nid = n["id"]
+        ids.add(nid)
+        id_list.append(nid)
+        suffix.setdefault(nid.rsplit(":", 1)[-1], []).append(nid)
+    return {"ids": ids, "id_list": id_list, "suffix": suffix}
+
+
+def resolve_node_id(graph: Dict[str, Any], ref: Optional[str], index: Optional[Dict[str, Any]] = None) -> Optional[str]:
     """
     Accepts:
       - full ids: func:..., file:..., class:...
@@ -22,8 +38,9 @@ def resolve_node_id(graph: Dict[str, Any], ref: Optional[str]) -> Optional[str]:
     if not ref:
         return None
 
-    nodes = [n for n in graph.get("nodes", []) if isinstance(n, dict) and n.get("id")]
-    ids = set(n["id"] for n in nodes)
+    if index is None:
+        index = build_resolver_index(graph)
+    ids = index["ids"]
 
     if ref in ids:
         return ref
@@ -46,17 +63,61 @@ def resolve_node_id(graph: Dict[str, Any], ref: Optional[str]) -> Optional[str]:
         if cand2 in ids:
             return cand2
 
-    # suffix match (best effort)
+    # suffix match (best effort): whole trailing segment first, then any id suffix
+    hits = index["suffix"].get(ref)
+    if hits:
+        return hits[0]
     for nid in ids:
         if nid.endswith(ref):
             return nid
 
     return None
 
-def suggest_nodes(graph: Dict[str, Any], needle: str, limit: int = 12) -> List[str]:
+def _build_trigrams(id_list: List[str]) -> Dict[str, Set[int]]:
+    """trigram -> positions in id_list of the ids containing it"""
+    tri: Dict[str, Set[int]] = {}
+    for i, nid in enumerate(id_list):
+        for j in range(len(nid) - 2):
+            g = nid[j:j + 3]
+            bucket = tri.get(g)
+            if bucket is None:
+                tri[g] = {i}
+            else:
+                bucket.add(i)
+    return tri
+
+
+def _trigram_candidates(index: Dict[str, Any], needle: str) -> List[int]:
+    tri = index.get("trigrams")
+    if tri is None:
+        tri = index["trigrams"] = _build_trigrams(index["id_list"])
+
+    postings = []
+    for g in {needle[j:j + 3] for j in range(len(needle) - 2)}:
+        bucket = tri.get(g)
+        if not bucket:
+            return []
+        postings.append(bucket)
+    postings.sort(key=len)
+
+    cands = set(postings[0])
+    for bucket in postings[1:]:
+        cands &= bucket
+        if not cands:
+            return []
+    return sorted(cands)
+
+
+def suggest_nodes(graph: Dict[str, Any], needle: str, limit: int = 12, index: Optional[Dict[str, Any]] = None) -> List[str]:
+    if index is not None:
+        id_list = index["id_list"]
+        # every trigram of the needle must occur in a match; confirm with `in` on the survivors
+        if len(needle) >= 3:
+            id_list = [id_list[i] for i in _trigram_candidates(index, needle)]
+    else:
+        id_list = [(n or {}).get("id", "") for n in graph.get("nodes", [])]
     out = []
-    for n in graph.get("nodes", []):
-        nid = (n or {}).get("id", "")
+    for nid in id_list:
         if needle in nid:
             out.append(nid)
             if len(out) >= limit:
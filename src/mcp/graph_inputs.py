@@ -1,30 +1,30 @@
 # src/mcp/graph_inputs.py
+import re
 from typing import Optional
 
+from src.mcp.query_types import QUERY_ALIASES
+
+_CTRL_RE = re.compile(r"[\x00-\x1f]")
+
 def reject_control_chars(s: str) -> Optional[str]:
-    for ch in s:
-        if ord(ch) < 32:
-            return (
-                "Path contains control characters (e.g. TAB). "
-                "In Inspector use forward slashes like C:/Users/.../project"
-            )
+    if _CTRL_RE.search(s):
+        return (
+            "Path contains control characters (e.g. TAB). "
+            "In Inspector use forward slashes like C:/Users/.../project"
+        )
     return None
 
+_RESOLVE_CALLS_MAP = {
+    "fast": "fallback_only",
+    "no_jedi": "fallback_only",
+    "nojedi": "fallback_only",
+    "fallback": "fallback_only",
+    "fallback_only": "fallback_only",
+}
+
 def normalize_resolve_calls(v: str) -> str:
-    v = (v or "").strip().lower()
-    if v in {"fast", "no_jedi", "nojedi", "fallback", "fallback_only"}:
-        return "fallback_only"
-    return "jedi"
+    return _RESOLVE_CALLS_MAP.get((v or "").strip().lower(), "jedi")
 
 def normalize_query_type(v: str) -> str:
     v = (v or "").strip().lower()
-    aliases = {
-        "outgoing": "callees",
-        "calls": "callees",
-        "incoming": "callers",
-        "used_by": "callers",
-        "reachable": "dependencies",
-        "rev_deps": "reverse_dependencies",
-        "deps": "dependencies",
-    }
-    return aliases.get(v, v)
+    return QUERY_ALIASES.get(v, v)
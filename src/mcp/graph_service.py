@@ -1,20 +1,34 @@
 # src/mcp/graph_service.py
-from ast import List
+from functools import lru_cache
 from typing import Any, Dict, Optional, Tuple
 
-from src.analysis.graph_builder import build_project_graph
 from src.analysis.graph_cache import GraphCache
-from src.analysis.graph_stats import graph_overview as graph_overview_impl
+from src.analysis.graph_stats import graph_overview as graph_overview_impl, overview_index
 from src.analysis.graph_queries import (
-    find_callers, find_callees, find_dependencies, find_reverse_dependencies, find_path
+    build_edge_index, find_callers, find_callees, find_dependencies, find_reverse_dependencies, find_path
 )
-from src.analysis.graph_viz import export_mermaid, export_dot
-from src.analysis.node_resolver import resolve_node_id, suggest_nodes
-from src.analysis.call_classify_gemini import classify_callees_with_gemini
+from src.analysis.graph_viz import (
+    DEFAULT_EDGE_TYPES, build_edges_by_type, build_viz_adjacency, export_mermaid, export_dot
+)
+from src.analysis.node_resolver import build_resolver_index, resolve_node_id, suggest_nodes
+from src.mcp.query_types import QUERY_ALIASES
+
+# Single-target queries; "path" needs a second node and is handled separately.
+_QUERY_DISPATCH = {
+    "callers": find_callers,
+    "callees": find_callees,
+    "dependencies": find_dependencies,
+    "reverse_dependencies": find_reverse_dependencies,
+}
+
+# graph_builder (jedi) and call_classify_gemini (requests) are imported where they are used,
+# so the server starts answering tools before those heavy imports are paid.
 
 class GraphService:
     def __init__(self, cache: GraphCache):
         self.cache = cache
+        # (graph_id, fingerprint, ref) -> resolved id; cleared whenever a graph is refreshed
+        self._resolve_cached = lru_cache(maxsize=4096)(self._resolve_uncached)
 
     def _build_graph_impl(
         self,
@@ -23,6 +37,8 @@ class GraphService:
         include_external: bool,
         resolve_calls: str,
     ) -> Dict[str, Any]:
+        from src.analysis.graph_builder import build_project_graph
+
         return build_project_graph(
             root_path,
             granularity=granularity,
@@ -65,6 +81,43 @@ class GraphService:
             res["graph"] = entry.graph
         return res
 
+    @staticmethod
+    def _edge_index(entry: Any) -> Dict[str, Dict]:
+        return entry.memo("edge_index", lambda: build_edge_index(entry.graph))
+
+    @staticmethod
+    def _node_by_id(entry: Any) -> Dict[str, Dict[str, Any]]:
+        return entry.memo("node_by_id", lambda: {
+            n["id"]: n for n in entry.graph.get("nodes", []) if isinstance(n, dict) and isinstance(n.get("id"), str)
+        })
+
+    @staticmethod
+    def _edges_by_type(entry: Any) -> Dict[str, list]:
+        return entry.memo("edges_by_type", lambda: build_edges_by_type(entry.graph))
+
+    @classmethod
+    def _viz_adjacency(cls, entry: Any, edge_types: frozenset = frozenset(DEFAULT_EDGE_TYPES)) -> Dict[str, Any]:
+        return entry.memo(
+            ("viz_adj", edge_types),
+            lambda: build_viz_adjacency(entry.graph, set(edge_types), cls._edges_by_type(entry)),
+        )
+
+    @staticmethod
+    def _resolver_index(entry: Any) -> Dict[str, Any]:
+        return entry.memo("resolver", lambda: build_resolver_index(entry.graph))
+
+    def _suggest(self, entry: Any, needle: str, limit: int = 12) -> list:
+        return suggest_nodes(entry.graph, needle, limit=limit, index=self._resolver_index(entry))
+
+    def _resolve_uncached(self, graph_id: str, fingerprint: str, ref: Optional[str]) -> Optional[str]:
+        entry = self.cache.peek(graph_id)
+        if entry is None or entry.fingerprint != fingerprint:
+            return None
+        return resolve_node_id(entry.graph, ref, index=self._resolver_index(entry))
+
+    def _resolve(self, entry: Any, ref: Optional[str]) -> Optional[str]:
+        return self._resolve_cached(entry.graph_id, entry.fingerprint, ref)
+
     def _get_entry(self, graph_id: str, refresh_if_stale: bool) -> Tuple[Optional[Any], bool, Optional[Dict[str, Any]]]:
         entry = self.cache.get(graph_id)
         if not entry:
@@ -75,6 +128,8 @@ class GraphService:
             entry2, refreshed = self.cache.refresh_if_stale(graph_id, builder=self._build_graph_impl)
             if entry2:
                 entry = entry2
+            if refreshed:
+                self._resolve_cached.cache_clear()
 
         return entry, refreshed, None
 
@@ -82,7 +137,8 @@ class GraphService:
         entry, refreshed, err = self._get_entry(graph_id, refresh_if_stale)
         if err:
             return err
-        return {"ok": True, "graph_id": graph_id, "refreshed": refreshed, "overview": graph_overview_impl(entry.graph)}
+        index = entry.memo("overview:call", lambda: overview_index(entry.graph, "call"))
+        return {"ok": True, "graph_id": graph_id, "refreshed": refreshed, "overview": graph_overview_impl(entry.graph, index=index)}
 
     def search_nodes(self, graph_id: str, query: str, limit: int = 12, refresh_if_stale: bool = True) -> Dict[str, Any]:
         entry, refreshed, err = self._get_entry(graph_id, refresh_if_stale)
@@ -92,7 +148,7 @@ class GraphService:
             "ok": True,
             "graph_id": graph_id,
             "refreshed": refreshed,
-            "matches": suggest_nodes(entry.graph, query, limit=limit),
+            "matches": self._suggest(entry, query, limit=limit),
             "hint": 'Use returned ids as target/focus (e.g. "func:b.py:process").',
         }
 
@@ -109,36 +165,31 @@ class GraphService:
             return err
 
         g = entry.graph
-        resolved_target = resolve_node_id(g, target)
+        resolved_target = self._resolve(entry, target)
         if not resolved_target:
             return {
                 "ok": False,
                 "error": f"Unknown target node id: {target}",
-                "suggestions": suggest_nodes(g, target),
+                "suggestions": self._suggest(entry, target),
                 "hint": 'Try "func:b.py:process" or call search_nodes(graph_id, "process")',
             }
 
-        if query_type == "callers":
-            return {"ok": True, "graph_id": graph_id, "refreshed": refreshed, "result": find_callers(g, resolved_target)}
-        if query_type == "callees":
-            return {"ok": True, "graph_id": graph_id, "refreshed": refreshed, "result": find_callees(g, resolved_target)}
-        if query_type == "dependencies":
-            return {"ok": True, "graph_id": graph_id, "refreshed": refreshed, "result": find_dependencies(g, resolved_target)}
-        if query_type == "reverse_dependencies":
-            return {"ok": True, "graph_id": graph_id, "refreshed": refreshed, "result": find_reverse_dependencies(g, resolved_target)}
+        fn = _QUERY_DISPATCH.get(query_type)
+        if fn:
+            return {"ok": True, "graph_id": graph_id, "refreshed": refreshed, "result": fn(g, resolved_target, index=self._edge_index(entry))}
         if query_type == "path":
             if not path_target:
                 return {"ok": False, "error": "query_type=path requires path_target"}
-            resolved_path_target = resolve_node_id(g, path_target)
+            resolved_path_target = self._resolve(entry, path_target)
             if not resolved_path_target:
-                return {"ok": False, "error": f"Unknown path_target node id: {path_target}", "suggestions": suggest_nodes(g, path_target)}
-            return {"ok": True, "graph_id": graph_id, "refreshed": refreshed, "result": find_path(g, resolved_target, resolved_path_target)}
+                return {"ok": False, "error": f"Unknown path_target node id: {path_target}", "suggestions": self._suggest(entry, path_target)}
+            return {"ok": True, "graph_id": graph_id, "refreshed": refreshed, "result": find_path(g, resolved_target, resolved_path_target, index=self._edge_index(entry))}
 
         return {
             "ok": False,
             "error": f"Unknown query_type: {query_type}",
-            "allowed": ["callers", "callees", "dependencies", "reverse_dependencies", "path"],
-            "aliases": {"outgoing": "callees", "incoming": "callers"},
+            "allowed": [*_QUERY_DISPATCH, "path"],
+            "aliases": dict(QUERY_ALIASES),
         }
 
     def export_call_graph(
@@ -157,20 +208,21 @@ class GraphService:
         g = entry.graph
         resolved_focus = None
         if focus:
-            resolved_focus = resolve_node_id(g, focus)
+            resolved_focus = self._resolve(entry, focus)
             if not resolved_focus:
                 return {
                     "ok": False,
                     "error": f"Unknown focus node id: {focus}",
-                    "suggestions": suggest_nodes(g, focus),
+                    "suggestions": self._suggest(entry, focus),
                     "hint": 'Try "func:b.py:process" (note func: prefix)',
                 }
+        adjacency = self._viz_adjacency(entry)
 
         if format == "dot":
-            dot, meta = export_dot(g, focus=resolved_focus, direction=direction, depth=depth)
+            dot, meta = export_dot(g, focus=resolved_focus, direction=direction, depth=depth, adjacency=adjacency, edges_by_type=self._edges_by_type(entry))
             return {"ok": True, "graph_id": graph_id, "refreshed": refreshed, "dot": dot, "meta": meta}
 
-        mermaid, meta = export_mermaid(g, focus=resolved_focus, direction=direction, depth=depth)
+        mermaid, meta = export_mermaid(g, focus=resolved_focus, direction=direction, depth=depth, adjacency=adjacency, edges_by_type=self._edges_by_type(entry))
         return {"ok": True, "graph_id": graph_id, "refreshed": refreshed, "mermaid": mermaid, "meta": meta}
 
     
@@ -184,37 +236,36 @@ class GraphService:
         temperature: float = 0.2,
         max_output_tokens: int = 10000,
         refresh_if_stale: bool = True,
+        ttl_seconds: int = 7 * 86400,
+        ignore_cache: bool = False,
     ) -> Dict[str, Any]:
         entry, refreshed, err = self._get_entry(graph_id, refresh_if_stale)
         if err:
             return err
 
         g = entry.graph
-        resolved_target = resolve_node_id(g, target)
+        resolved_target = self._resolve(entry, target)
         if not resolved_target:
             return {
                 "ok": False,
                 "error": f"Unknown target node id: {target}",
-                "suggestions": suggest_nodes(g, target),
+                "suggestions": self._suggest(entry, target),
                 "hint": 'Try search_nodes(graph_id, "query_graph") and use returned id',
             }
 
-        # find node dict
-        target_node = None
-        for n in g.get("nodes", []):
-            if isinstance(n, dict) and n.get("id") == resolved_target:
-                target_node = n
-                break
+        target_node = self._node_by_id(entry).get(resolved_target)
         if not target_node:
             return {"ok": False, "error": f"Target node not found in graph: {resolved_target}"}
 
         # callees from graph edges (direct calls)
-        callees = find_callees(g, resolved_target)
+        callees = find_callees(g, resolved_target, index=self._edge_index(entry))
 
         
         if max_output_tokens > 4096:
             max_output_tokens = 4096
 
+        from src.analysis.call_classify_gemini import classify_callees_with_gemini
+
         ai = classify_callees_with_gemini(
             root_abs=entry.root,
             target_node=target_node,
@@ -224,6 +275,10 @@ class GraphService:
             model=model,
             temperature=temperature,
             max_output_tokens=max_output_tokens,
+            response_cache=self.cache.store,
+            ttl_seconds=ttl_seconds,
+            ignore_cache=ignore_cache,
+            prepared=self._prepared_prompt(entry, target_node, resolved_target, callees),
         )
 
 
@@ -234,4 +289,139 @@ class GraphService:
             "target_resolved": resolved_target,
             "callees": callees,
             "gemini": ai,
-        }
\ No newline at end of file
+        }
+
+    @staticmethod
+    def _prepared_prompt(entry: Any, target_node: Dict[str, Any], target_id: str, callees: list) -> Optional[Dict[str, Any]]:
+        """
+        Source slice + prompt for one target. Memoized on the entry, so it goes away with
+        it (rebuild, LRU eviction, clear_graph_cache). None on error: the classifier reports it.
+        """
+        def prepare() -> Optional[Dict[str, Any]]:
+            from src.analysis.call_classify_gemini import prepare_call_certainty_prompt
+
+            prepared, err = prepare_call_certainty_prompt(
+                root_abs=entry.root, target_node=target_node, target_id=target_id, callees=callees
+            )
+            return None if err else prepared
+
+        return entry.memo(("prompt", target_id), prepare)
+
+    def _resolve_targets(self, entry: Any, targets: list) -> Tuple[list, list]:
+        g = entry.graph
+        index = self._edge_index(entry)
+        nodes_by_id = self._node_by_id(entry)
+
+        unresolved = []
+        batch = []
+        for target in targets:
+            resolved_target = self._resolve(entry, target)
+            if not resolved_target or resolved_target not in nodes_by_id:
+                unresolved.append({"target": target, "suggestions": self._suggest(entry, target)})
+                continue
+            batch.append({
+                "target_id": resolved_target,
+                "target_node": nodes_by_id[resolved_target],
+                "callees": find_callees(g, resolved_target, index=index),
+            })
+        return batch, unresolved
+
+    def call_certainty_gemini_batch(
+        self,
+        graph_id: str,
+        targets: list,
+        model: str = "gemini-2.5-flash",
+        api_key: Optional[str] = None,
+        temperature: float = 0.2,
+        max_output_tokens: int = 10000,
+        max_batch_size: int = 8,
+        refresh_if_stale: bool = True,
+        ttl_seconds: int = 7 * 86400,
+        ignore_cache: bool = False,
+    ) -> Dict[str, Any]:
+        entry, refreshed, err = self._get_entry(graph_id, refresh_if_stale)
+        if err:
+            return err
+
+        batch, unresolved = self._resolve_targets(entry, targets)
+
+        if max_output_tokens > 4096:
+            max_output_tokens = 4096
+
+        ai = {"ok": True, "requests": 0, "results": []}
+        if batch:
+            from src.analysis.call_classify_gemini import classify_callees_batch_with_gemini
+
+            ai = classify_callees_batch_with_gemini(
+                root_abs=entry.root,
+                targets=batch,
+                api_key=api_key,
+                model=model,
+                temperature=temperature,
+                max_output_tokens=max_output_tokens,
+                max_batch_size=max_batch_size,
+                response_cache=self.cache.store,
+                ttl_seconds=ttl_seconds,
+                ignore_cache=ignore_cache,
+            )
+
+        return {
+            "ok": ai.get("ok", False) and not unresolved,
+            "graph_id": graph_id,
+            "refreshed": refreshed,
+            "unresolved": unresolved,
+            "gemini": ai,
+        }
+
+    async def call_certainty_gemini_many(
+        self,
+        graph_id: str,
+        targets: list,
+        concurrency: int = 8,
+        model: str = "gemini-2.5-flash",
+        api_key: Optional[str] = None,
+        temperature: float = 0.2,
+        max_output_tokens: int = 10000,
+        refresh_if_stale: bool = True,
+        ttl_seconds: int = 7 * 86400,
+        ignore_cache: bool = False,
+    ) -> Dict[str, Any]:
+        entry, refreshed, err = self._get_entry(graph_id, refresh_if_stale)
+        if err:
+            return err
+
+        batch, unresolved = self._resolve_targets(entry, targets)
+
+        if max_output_tokens > 4096:
+            max_output_tokens = 4096
+
+        results = []
+        if batch:
+            from src.analysis.call_classify_gemini import classify_many
+
+            results = await classify_many(
+                [
+                    dict(
+                        t,
+                        root_abs=entry.root,
+                        api_key=api_key,
+                        model=model,
+                        temperature=temperature,
+                        max_output_tokens=max_output_tokens,
+                        response_cache=self.cache.store,
+                        ttl_seconds=ttl_seconds,
+                        ignore_cache=ignore_cache,
+                        prepared=self._prepared_prompt(entry, t["target_node"], t["target_id"], t["callees"]),
+                    )
+                    for t in batch
+                ],
+                concurrency=concurrency,
+            )
+
+        return {
+            "ok": not unresolved and all(r.get("ok") for r in results),
+            "graph_id": graph_id,
+            "refreshed": refreshed,
+            "unresolved": unresolved,
+            "results": results,
+        }
@@ -0,0 +1,13 @@
+# src/mcp/query_types.py
+from typing import Dict
+
+# alias -> canonical query_type; shared by the tool inputs and node_resolver
+QUERY_ALIASES: Dict[str, str] = {
+    "outgoing": "callees",
+    "calls": "callees",
+    "incoming": "callers",
+    "used_by": "callers",
+    "reachable": "dependencies",
+    "deps": "dependencies",
+    "rev_deps": "reverse_dependencies",
+}
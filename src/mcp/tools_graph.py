@@ -1,5 +1,5 @@
 # src/mcp/tools_graph.py
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from mcp.server.fastmcp import FastMCP
 
 from src.mcp.graph_inputs import (
@@ -36,10 +36,14 @@ def register_graph_tools(mcp: FastMCP, svc: GraphService) -> None:
 
     @mcp.tool()
     def list_cached_graphs() -> Dict[str, Any]:
-        return {"ok": True, "graphs": svc.cache.list()}
+        return {"ok": True, "graphs": svc.cache.list(), "stats": svc.cache.stats()}
 
     @mcp.tool()
     def clear_graph_cache(graph_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Drops one graph (or every graph held by this server) from memory and from the persistent store.
+        Stored graphs this server doesn't currently hold (other processes, evicted entries) are kept.
+        """
         return {"ok": True, **svc.cache.clear(graph_id or "all")}
 
     @mcp.tool()
@@ -96,10 +100,13 @@ def register_graph_tools(mcp: FastMCP, svc: GraphService) -> None:
         temperature: float = 0.2,
         max_output_tokens: int = 10000,
         refresh_if_stale: bool = True,
+        ttl_seconds: int = 7 * 86400,
+        ignore_cache: bool = False,
     ) -> Dict[str, Any]:
         """
         For a target function, send its source code + the graph-extracted callees list to Gemini.
         Gemini returns JSON classifying each callee as always/conditional/unlikely/unknown.
+        Identical requests within ttl_seconds are answered from the local cache (ignore_cache=True forces a new call).
         """
         return svc.call_certainty_gemini(
             graph_id=graph_id,
@@ -109,4 +116,66 @@ def register_graph_tools(mcp: FastMCP, svc: GraphService) -> None:
             temperature=temperature,
             max_output_tokens=max_output_tokens,
             refresh_if_stale=refresh_if_stale,
-        )
\ No newline at end of file
+            ttl_seconds=ttl_seconds,
+            ignore_cache=ignore_cache,
+        )
+
+    @mcp.tool()
+    def call_certainty_gemini_batch(
+        graph_id: str,
+        targets: List[str],
+        model: str = "gemini-2.5-flash",
+        api_key: Optional[str] = None,
+        temperature: float = 0.2,
+        max_output_tokens: int = 10000,
+        max_batch_size: int = 8,
+        refresh_if_stale: bool = True,
+        ttl_seconds: int = 7 * 86400,
+        ignore_cache: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Like call_certainty_gemini for several targets at once.
+        Targets from the same file are classified together in one Gemini request (up to max_batch_size each).
+        """
+        return svc.call_certainty_gemini_batch(
+            graph_id=graph_id,
+            targets=targets,
+            model=model,
+            api_key=api_key,
+            temperature=temperature,
+            max_output_tokens=max_output_tokens,
+            max_batch_size=max_batch_size,
+            refresh_if_stale=refresh_if_stale,
+            ttl_seconds=ttl_seconds,
+            ignore_cache=ignore_cache,
+        )
+
+    @mcp.tool()
+    async def call_certainty_gemini_many(
+        graph_id: str,
+        targets: List[str],
+        concurrency: int = 8,
+        model: str = "gemini-2.5-flash",
+        api_key: Optional[str] = None,
+        temperature: float = 0.2,
+        max_output_tokens: int = 10000,
+        refresh_if_stale: bool = True,
+        ttl_seconds: int = 7 * 86400,
+        ignore_cache: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Runs call_certainty_gemini for each target, with up to `concurrency` Gemini requests in flight.
+        Results keep the order of the resolved targets.
+        """
+        return await svc.call_certainty_gemini_many(
+            graph_id=graph_id,
+            targets=targets,
+            concurrency=concurrency,
+            model=model,
+            api_key=api_key,
+            temperature=temperature,
+            max_output_tokens=max_output_tokens,
+            refresh_if_stale=refresh_if_stale,
+            ttl_seconds=ttl_seconds,
+            ignore_cache=ignore_cache,
+        )
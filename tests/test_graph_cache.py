@@ -0,0 +1,198 @@
+import json
+import random
+from collections import deque
+
+import pytest
+
+from src.analysis import graph_cache
+from src.analysis.call_classify_gemini import _parse_gemini_response
+from src.analysis.graph_cache import GraphCache
+from src.analysis.graph_queries import _bfs_path, build_edge_index
+from src.analysis.graph_sqlite_cache import GraphSqliteCache
+
+
+def _project(tmp_path, name="proj"):
+    root = tmp_path / name
+    root.mkdir()
+    (root / "a.py").write_text("def f():\n    return 1\n")
+    return root
+
+
+class CountingBuilder:
+    def __init__(self, payload_size=0):
+        self.calls = 0
+        self.payload_size = payload_size
+
+    def __call__(self, root, granularity, include_external, resolve_calls):
+        self.calls += 1
+        return {"nodes": [{"id": "func:a.py:f", "type": "function", "pad": "x" * self.payload_size}], "edges": []}
+
+
+def _build(cache, root, builder, **kw):
+    return cache.build_or_get(str(root), "function", False, "fallback_only", builder, **kw)
+
+
+# -------------------- persistence --------------------
+
+def test_warm_start_from_store(tmp_path):
+    root = _project(tmp_path)
+    db = str(tmp_path / "graphs.sqlite3")
+    builder = CountingBuilder()
+
+    entry, cached = _build(GraphCache(store=GraphSqliteCache(db)), root, builder)
+    assert not cached and builder.calls == 1
+
+    # a fresh cache (new server process) on the same DB reuses the stored graph
+    entry2, cached2 = _build(GraphCache(store=GraphSqliteCache(db)), root, builder)
+    assert cached2 and builder.calls == 1
+    assert entry2.graph == entry.graph
+
+
+def test_store_rebuilds_on_format_version_mismatch(tmp_path, monkeypatch):
+    root = _project(tmp_path)
+    db = str(tmp_path / "graphs.sqlite3")
+    builder = CountingBuilder()
+    _build(GraphCache(store=GraphSqliteCache(db)), root, builder)
+
+    monkeypatch.setattr(graph_cache, "GRAPH_FORMAT_VERSION", graph_cache.GRAPH_FORMAT_VERSION + 1)
+    _, cached = _build(GraphCache(store=GraphSqliteCache(db)), root, builder)
+    assert not cached and builder.calls == 2
+
+
+def test_store_rebuilds_when_project_changed(tmp_path):
+    root = _project(tmp_path)
+    db = str(tmp_path / "graphs.sqlite3")
+    builder = CountingBuilder()
+    _build(GraphCache(store=GraphSqliteCache(db)), root, builder)
+
+    (root / "b.py").write_text("def g():\n    pass\n")
+    _, cached = _build(GraphCache(store=GraphSqliteCache(db)), root, builder)
+    assert not cached and builder.calls == 2
+
+
+def test_clear_all_keeps_rows_of_other_caches(tmp_path):
+    root = _project(tmp_path)
+    db = str(tmp_path / "graphs.sqlite3")
+    mine = GraphCache(store=GraphSqliteCache(db))
+    other = GraphCache(store=GraphSqliteCache(db))
+    mine.build_or_get(str(root), "function", False, "fallback_only", CountingBuilder())
+    other.build_or_get(str(root), "file", False, "fallback_only", CountingBuilder())
+
+    assert mine.clear("all") == {"cleared": "all", "count": 1}
+    fresh = GraphCache(store=GraphSqliteCache(db))
+    _, cached = fresh.build_or_get(str(root), "file", False, "fallback_only", CountingBuilder())
+    assert cached
+    _, cached = _build(fresh, root, CountingBuilder())
+    assert not cached
+
+
+# -------------------- in-memory LRU --------------------
+
+def test_eviction_by_bytes(tmp_path):
+    roots = [_project(tmp_path, f"p{i}") for i in range(3)]
+    builder = CountingBuilder(payload_size=10_000)
+    cache = GraphCache(max_entries=10, max_bytes=25_000)
+
+    entries = [_build(cache, r, builder)[0] for r in roots]
+    assert all(e.size_bytes > 10_000 for e in entries)
+    # the oldest graph was dropped to get back under max_bytes
+    assert cache.peek(entries[0].graph_id) is None
+    assert cache.peek(entries[1].graph_id) is entries[1]
+    assert cache.peek(entries[2].graph_id) is entries[2]
+
+
+def test_single_entry_over_max_bytes_is_kept(tmp_path):
+    cache = GraphCache(max_bytes=100)
+    entry, _ = _build(cache, _project(tmp_path), CountingBuilder(payload_size=10_000))
+    assert cache.peek(entry.graph_id) is entry
+
+
+def test_refresh_if_stale_clears_derived(tmp_path):
+    root = _project(tmp_path)
+    builder = CountingBuilder()
+    cache = GraphCache()
+    entry, _ = _build(cache, root, builder)
+
+    entry.memo("edge_index", lambda: "old")
+    assert cache.refresh_if_stale(entry.graph_id, builder) == (entry, False)
+    assert entry.derived == {"edge_index": "old"}
+
+    (root / "a.py").write_text("def f():\n    return 2 + 2\n")
+    refreshed, changed = cache.refresh_if_stale(entry.graph_id, builder)
+    assert changed and refreshed is entry
+    assert entry.derived == {}
+    assert entry.memo("edge_index", lambda: "new") == "new"
+
+
+def test_memo_caches_none():
+    entry = graph_cache.GraphEntry("g", "/r", "function", False, "jedi", "fp", {}, 0)
+    calls = []
+    for _ in range(2):
+        assert entry.memo("x", lambda: calls.append(1)) is None
+    assert len(calls) == 1
+
+
+# -------------------- queries --------------------
+
+def _plain_bfs_path(edges, source, target):
+    # the parent-map BFS find_path used before the CSR index existed
+    adj = {}
+    for s, t in edges:
+        adj.setdefault(s, []).append(t)
+    parents = {source: None}
+    queue = deque([source])
+    while queue:
+        cur = queue.popleft()
+        if cur == target:
+            break
+        for nb in adj.get(cur, []):
+            if nb not in parents:
+                parents[nb] = cur
+                queue.append(nb)
+    if target not in parents:
+        return []
+    path = []
+    while target is not None:
+        path.append(target)
+        target = parents[target]
+    return path[::-1]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_bfs_path_matches_plain_bfs_length(seed):
+    rng = random.Random(seed)
+    n = 40
+    edges = [(f"n{rng.randrange(n)}", f"n{rng.randrange(n)}") for _ in range(rng.randrange(20, 120))]
+    graph = {"edges": [{"source": s, "target": t, "type": "call"} for s, t in edges]}
+    csr = build_edge_index(graph)["csr"]
+    edge_set = set(edges)
+
+    for _ in range(30):
+        src, dst = f"n{rng.randrange(n)}", f"n{rng.randrange(n)}"
+        expected = _plain_bfs_path(edges, src, dst)
+        got = _bfs_path(csr, src, dst)
+        assert len(got) == len(expected)
+        if got:
+            assert got[0] == src and got[-1] == dst
+            assert all(pair in edge_set for pair in zip(got, got[1:]))
+
+
+# -------------------- Gemini response parsing --------------------
+
+def _gemini_body(text):
+    return json.dumps({"candidates": [{"content": {"parts": [{"text": text}]}}]}).encode()
+
+
+def test_parse_gemini_response_fenced():
+    text = '```json\n{"target_id": "func:a.py:f", "calls": [{"callee": "x"}]}\n```'
+    assert _parse_gemini_response(_gemini_body(text))["calls"] == [{"callee": "x"}]
+
+
+def test_parse_gemini_response_prefixed_skips_other_objects():
+    text = 'Sure! Input was {"callees": ["x"]}. Answer: {"results": [{"target_id": "t", "calls": []}]}'
+    assert _parse_gemini_response(_gemini_body(text)) == {"results": [{"target_id": "t", "calls": []}]}
+
+
+def test_parse_gemini_response_without_expected_schema_raises():
+    with pytest.raises(ValueError):
+        _parse_gemini_response(_gemini_body('Here you go: {"unrelated": 1}'))